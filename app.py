@@ -1,16 +1,13 @@
 import streamlit as st
-import pandas as pd
-import re
-from googleapiclient.discovery import build
-from textblob import TextBlob
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime
-import numpy as np
 import time
 import os
 import hashlib
+import html
 import warnings
+import weakref
+import metrics
+import session_memory
 
 warnings.filterwarnings("ignore")
 
@@ -18,6 +15,19 @@ APP_VERSION = "2.2.0"
 APP_NAME = "YouTube Sentiment Analysis"
 DEPLOYMENT_MODE = os.environ.get("DEPLOYMENT_MODE", "production")
 SESSION_TIMEOUT_MINUTES = 60
+MAX_COMMENTS_CEILING = int(os.environ.get("MAX_COMMENTS_CEILING", "200000"))
+EXPLORE_PAGE_SIZES = [25, 50, 100, 200]
+EXPLORE_VIEW_CACHE = 8
+EXPORT_CACHE = 4
+ARCHIVE_POLL_SECONDS = 1.0
+TIMELINE_WINDOWS = [1, 3, 7, 14, 24, 30]
+EXPLORE_SORTS = {
+    "Newest": ("published_at", False),
+    "Oldest": ("published_at", True),
+    "Most Likes": ("like_count", False),
+    "Highest Sentiment": ("sentiment_score", False),
+    "Lowest Sentiment": ("sentiment_score", True),
+}
 
 st.set_page_config(
     page_title=f"{APP_NAME} v{APP_VERSION}",
@@ -44,7 +54,17 @@ def get_org_password():
         pass
     return "youtube2024"
 
+def get_admin_password():
+    env_pw = os.environ.get("APP_ADMIN_PASSWORD", "").strip()
+    if env_pw:
+        return env_pw
+    try:
+        return str(st.secrets.get("admin_password", "")).strip()
+    except Exception:
+        return ""
+
 ORG_PASSWORD = get_org_password()
+ADMIN_PASSWORD = get_admin_password()
 
 THEME = {
     "bg": "#ffffff",
@@ -196,6 +216,13 @@ def apply_style():
             color: var(--muted) !important;
         }}
 
+        mark {{
+            background: rgba(215,30,40,0.14) !important;
+            color: inherit !important;
+            border-radius: 4px;
+            padding: 0 2px;
+        }}
+
         .stTabs [data-baseweb="tab"] {{
             background: #ffffff !important;
             border: 1px solid var(--border) !important;
@@ -271,6 +298,22 @@ apply_style()
 def touch():
     st.session_state.last_activity = datetime.now()
 
+def register_session():
+    # Marks the session active for the reaper, with what to release if it goes
+    # idle. The video list, its LRU order and the channel groups are released
+    # with the data, so a reaped session comes back empty rather than listing
+    # videos it no longer has.
+    session_memory.REGISTRY.touch(
+        st.session_state.session_id,
+        current_videos=st.session_state.current_videos,
+        video_lru=st.session_state.video_lru,
+        collections=st.session_state.collections,
+        video_data=st.session_state.video_data,
+        scored_cache=st.session_state.scored_cache,
+        search_indexes=st.session_state.search_indexes,
+        **({"archive": st.session_state.archive_job} if "archive_job" in st.session_state else {}),
+    )
+
 def is_timed_out():
     last = st.session_state.get("last_activity")
     if not last:
@@ -278,6 +321,10 @@ def is_timed_out():
     return (datetime.now() - last).total_seconds() > SESSION_TIMEOUT_MINUTES * 60
 
 def logout():
+    if "archive_job" in st.session_state:
+        st.session_state.archive_job.discard()
+    session_memory.remove_spill(st.session_state.session_id)
+    session_memory.REGISTRY.forget(st.session_state.session_id)
     for k in list(st.session_state.keys()):
         del st.session_state[k]
     safe_rerun()
@@ -292,6 +339,20 @@ if "current_videos" not in st.session_state:
     st.session_state.current_videos = []
 if "last_activity" not in st.session_state:
     st.session_state.last_activity = datetime.now()
+if "scored_cache" not in st.session_state:
+    st.session_state.scored_cache = {}
+if "scored_stats" not in st.session_state:
+    st.session_state.scored_stats = {"hits": 0, "misses": 0}
+if "is_admin" not in st.session_state:
+    st.session_state.is_admin = False
+if "stage_metrics" not in st.session_state:
+    st.session_state.stage_metrics = metrics.Registry()
+if "search_indexes" not in st.session_state:
+    st.session_state.search_indexes = {}
+if "video_lru" not in st.session_state:
+    st.session_state.video_lru = []
+if "collections" not in st.session_state:
+    st.session_state.collections = {}
 
 def login_screen():
     st.markdown('<div style="height: 1.8rem;"></div>', unsafe_allow_html=True)
@@ -317,7 +378,12 @@ def login_screen():
             ok = st.form_submit_button("Sign in", use_container_width=True)
 
         if ok:
-            if pw == ORG_PASSWORD:
+            if ADMIN_PASSWORD and pw == ADMIN_PASSWORD:
+                st.session_state.authenticated = True
+                st.session_state.is_admin = True
+                touch()
+                safe_rerun()
+            elif pw == ORG_PASSWORD:
                 st.session_state.authenticated = True
                 touch()
                 safe_rerun()
@@ -335,136 +401,749 @@ if not st.session_state.authenticated:
     st.stop()
 
 touch()
+RERUN_STARTED = time.perf_counter()
+session_memory.REGISTRY.start(SESSION_TIMEOUT_MINUTES * 60)
+# Touched again when the run ends (release_memory); touching now as well
+# keeps a long run (a bulk add, a channel fetch) from being reaped midway.
+register_session()
+metrics.use_session(st.session_state.stage_metrics)
+
+# Heavy modules load past the password gate so the login screen paints
+# without them; after the first run these are sys.modules lookups.
+# benchmarks/startup.py profiles what the login screen still imports.
+with metrics.timer("startup_imports"):
+    import numpy as np
+    import pandas as pd
+    import sentiment_engine
+    import comment_store
+    import youtube_api
+    import quota
+    import search_index
+    import exports
+    import shared_cache
+    from pipeline import (
+        CHANNEL_DAYS,
+        CHANNEL_MAX_VIDEOS,
+        MAX_COMMENTS,
+        SCORE_COLUMNS,
+        TIMELINE_FREQS,
+        analyze_sentiment,
+        average_score,
+        collapse_duplicates,
+        collection_row,
+        comments_frame,
+        comments_hash,
+        comparison_row,
+        detailed_chunks,
+        download_video,
+        duplicate_count,
+        duplicate_groups,
+        extend_columns,
+        extract_source,
+        extract_video_id,
+        fetch_depth,
+        fetch_error_message,
+        fetch_many,
+        fetch_mode,
+        filter_replies,
+        has_replies,
+        iter_comment_pages,
+        load_covering,
+        load_stored,
+        merge_aggregates,
+        merge_timelines,
+        new_comment_columns,
+        parse_video_urls,
+        payload_bytes,
+        published_since,
+        resolve_source,
+        rolling_timeline,
+        sentiment_aggregate,
+        source_units,
+        source_videos,
+        stored_video,
+        summary_row,
+        timeline_buckets,
+        units_needed,
+        video_info,
+        video_payload,
+        with_scores,
+    )
 
-def extract_video_id(url):
-    patterns = [
-        r"(?:v=|\/)([0-9A-Za-z_-]{{11}})",
-        r"youtu\.be\/([0-9A-Za-z_-]{{11}})",
-        r"embed\/([0-9A-Za-z_-]{{11}})",
-    ]
-    for pattern in patterns:
-        m = re.search(pattern, url)
-        if m:
-            return m.group(1)
-    return None
-
-def youtube_client():
+def youtube_api_key():
     try:
         api_key = st.secrets["youtube_api_key"]
     except Exception:
         api_key = None
 
     if not api_key or not str(api_key).strip():
+        return None
+    return str(api_key).strip()
+
+@st.cache_resource(show_spinner=False)
+def shared_youtube(api_key):
+    return youtube_api.build_service(api_key)
+
+def youtube_client(api_key=None):
+    api_key = api_key or youtube_api_key()
+    if not api_key:
         st.error("Missing YouTube API key. Add youtube_api_key in st.secrets.")
         return None
 
-    return build("youtube", "v3", developerKey=api_key)
+    youtube_api.CLIENT_STATS["lookups"] += 1
+    return shared_youtube(api_key)
+
+def index_comments(vid, comment_ids, texts):
+    # Comments go into the video's search index as they are ingested; IDs
+    # already indexed are skipped, so a refresh only tokenizes new ones.
+    index = st.session_state.search_indexes.get(vid)
+    if index is None:
+        index = st.session_state.search_indexes[vid] = search_index.SearchIndex()
+    with metrics.timer("search_index"):
+        index.add(comment_ids, texts)
+    return index
+
+def index_video(vid, payload):
+    if payload is not None:
+        index_comments(vid, payload["df"]["comment_id"], payload["df"]["comment"])
+    return payload
+
+def video_index(vid, df):
+    index = st.session_state.search_indexes.get(vid)
+    if index is None or len(index) < len(df):
+        index = index_comments(vid, df["comment_id"], df["comment"])
+    return index
+
+def drop_index(vid=None):
+    if vid is None:
+        st.session_state.search_indexes = {}
+    else:
+        st.session_state.search_indexes.pop(vid, None)
+
+def cached_video(video_id, video_url):
+    # Session first, then the process-wide cache, then the comment store
+    # (loaded once for all sessions); shared and stored copies only count if
+    # they cover this session's comment limit and replies setting. Sessions
+    # keep references, not copies.
+    if video_id in st.session_state.video_data:
+        return st.session_state.video_data[video_id]
 
-def get_video_comments(youtube, video_id, max_comments=500):
-    all_comments = []
-    next_page_token = None
+    limit, replies = comment_limit(), st.session_state.get("fetch_replies", False)
+    payload = load_covering(
+        shared_cache.VIDEOS, video_id, lambda: stored_video(video_id, video_url, limit, replies), limit, replies
+    )
+    if payload is not None:
+        st.session_state.video_data[video_id] = payload
+        return index_video(video_id, payload)
+    return None
 
-    while len(all_comments) < max_comments:
-        try:
-            request = youtube.commentThreads().list(
-                part="snippet",
-                videoId=video_id,
-                maxResults=100,
-                pageToken=next_page_token,
-                textFormat="plainText",
-            )
-            response = request.execute()
-
-            for item in response.get("items", []):
-                s = item["snippet"]["topLevelComment"]["snippet"]
-                all_comments.append(
-                    {
-                        "comment": s.get("textDisplay", ""),
-                        "published_at": s.get("publishedAt", ""),
-                        "like_count": s.get("likeCount", 0),
-                        "author": s.get("authorDisplayName", "Unknown"),
-                    }
-                )
+def comment_limit():
+    return int(st.session_state.get("max_comments", MAX_COMMENTS))
 
-            next_page_token = response.get("nextPageToken")
-            if not next_page_token:
-                break
+def fetch_units(count=1, refresh=False):
+    # A refresh usually needs only videos.list plus a page or two.
+    return quota.estimate_units(quota.PAGE_SIZE if refresh else comment_limit(), videos=count)
 
-        except Exception as e:
-            msg = str(e)
-            if "commentsDisabled" in msg:
-                return []
-            return []
+def check_quota(units):
+    try:
+        quota.SCHEDULER.check(units)
+    except quota.QuotaError as e:
+        st.error(str(e))
+        return False
+    return True
+
+@metrics.timed("fetch_video")
+def fetch_video(video_id, video_url, refresh=False):
+    if not refresh:
+        payload = cached_video(video_id, video_url)
+        if payload is not None:
+            return payload
+
+    stored = load_stored(video_id)
+    fresh, _ = fetch_mode(stored, comment_limit(), st.session_state.get("fetch_replies", False))
+    if not check_quota(fetch_units(refresh=refresh and not fresh)):
+        return None
 
-    return all_comments
+    yt = youtube_client()
+    if yt is None:
+        return None
 
-def fetch_video(video_id, video_url):
-    if video_id in st.session_state.video_data:
-        return st.session_state.video_data[video_id]
+    def download():
+        return download_video(
+            yt,
+            video_id,
+            video_url,
+            stored,
+            max_comments=comment_limit(),
+            replies=st.session_state.get("fetch_replies", False),
+        )
+
+    # Sessions asking for the same video at the same time share one download.
+    try:
+        payload = load_covering(
+            shared_cache.VIDEOS,
+            video_id,
+            download,
+            comment_limit(),
+            st.session_state.get("fetch_replies", False),
+            refresh=refresh,
+        )
+    except Exception as e:
+        st.error(fetch_error_message(e))
+        return None
+
+    st.session_state.video_data[video_id] = payload
+    return index_video(video_id, payload)
+
+@metrics.timed("fetch_videos")
+def fetch_videos(items, on_progress=None, infos=None):
+    # Videos in the session, the shared cache or the comment store are served
+    # first; the client (and an API key) is only needed for the rest.
+    done, failed, todo = {}, {}, []
+    for vid, url in items:
+        payload = cached_video(vid, url)
+        if payload is not None:
+            done[vid] = payload
+        else:
+            todo.append((vid, url))
+    if not todo:
+        return done, failed
+
+    yt = youtube_client()
+    if yt is None:
+        return done, failed
+
+    if not check_quota(units_needed(todo, comment_limit(), infos, st.session_state.get("fetch_replies", False))):
+        return done, failed
+
+    results = fetch_many(
+        yt,
+        todo,
+        max_comments=comment_limit(),
+        replies=st.session_state.get("fetch_replies", False),
+        on_progress=on_progress,
+        cache=shared_cache.VIDEOS,
+        infos=infos,
+    )
+    for vid, payload, error in results:
+        if error is None:
+            done[vid] = index_video(vid, payload)
+        else:
+            failed[vid] = error
+    return done, failed
+
+def quota_note(start_units):
+    return (
+        f"{quota.SCHEDULER.stats['units'] - start_units:,} API units used • "
+        f"{quota.SCHEDULER.ledger.remaining():,} left today"
+    )
 
+def add_videos(items, infos=None):
+    # Fetches (video_id, url) pairs with a progress bar and one status line
+    # per video and adds them to the session; cached videos are added
+    # without a fetch. Returns {video_id: error} for the failed ones.
+    start_units = quota.SCHEDULER.stats["units"]
+    bar = st.progress(0.0, text=f"Fetching {len(items)} videos...")
+    lines = {vid: st.empty() for vid, _ in items}
+
+    def show_progress(status, finished, total):
+        bar.progress(finished / total, text=f"Fetched {finished} of {total} videos • {quota_note(start_units)}")
+        for vid, msg in status.items():
+            lines[vid].markdown(f"<div class='muted' style='font-size:13px;'>{vid} • {msg}</div>", unsafe_allow_html=True)
+
+    # Cached and stored videos are added without a fetch.
+    todo = []
+    for vid, url in items:
+        if cached_video(vid, url) is not None:
+            st.session_state.current_videos.append(vid)
+        else:
+            todo.append((vid, url))
+
+    done, failed = fetch_videos(todo, on_progress=show_progress, infos=infos)
+    for vid, url in todo:
+        if vid in done:
+            st.session_state.video_data[vid] = done[vid]
+            st.session_state.current_videos.append(vid)
+        elif vid not in failed:
+            failed[vid] = "Not fetched."
+    return failed
+
+@metrics.timed("list_source")
+def list_source(source, days, limit):
+    # Resolves a channel or playlist and lists its recent videos with their
+    # details, 50 per call. Returns (source, {video_id: details}) or None.
+    if not check_quota(source_units(limit)):
+        return None
     yt = youtube_client()
     if yt is None:
         return None
 
+    start_units = quota.SCHEDULER.stats["units"]
+    status = st.empty()
     try:
-        vr = yt.videos().list(part="snippet,statistics,status", id=video_id).execute()
-        if not vr.get("items"):
-            st.error("Video not found or not accessible.")
-            return None
-
-        info = vr["items"][0]
-        comments = get_video_comments(yt, video_id, max_comments=500)
-
-        if not comments:
-            st.error("No comments returned. Comments may be disabled for this video.")
-            return None
-
-        df = pd.DataFrame(comments)
-        df["published_at"] = pd.to_datetime(df["published_at"], errors="coerce")
-
-        payload = {
-            "df": df,
-            "title": info.get("snippet", {}).get("title", "Unknown Title"),
-            "url": video_url,
-            "stats": info.get("statistics", {}),
-        }
+        resolved = resolve_source(yt, source)
 
-        st.session_state.video_data[video_id] = payload
-        return payload
+        def on_batch(listed, kept):
+            status.markdown(
+                f"<div class='muted' style='font-size:13px;'>{html.escape(resolved['title'])} • listed {listed:,} videos, "
+                f"{kept:,} with comments • {quota_note(start_units)}</div>",
+                unsafe_allow_html=True,
+            )
 
+        with st.spinner("Listing videos..."):
+            infos = source_videos(yt, resolved, since=published_since(days), limit=limit, on_batch=on_batch)
     except Exception as e:
-        msg = str(e)
-        if "commentsDisabled" in msg:
-            st.error("This video has comments disabled. Pick another video.")
-            return None
-        if "quotaExceeded" in msg:
-            st.error("YouTube API quota exceeded. Try again later or use a new API key/project.")
-            return None
-        if "keyInvalid" in msg or "API key not valid" in msg:
-            st.error("Your YouTube API key is invalid. Check st.secrets['youtube_api_key'].")
-            return None
-        if "accessNotConfigured" in msg:
-            st.error("YouTube Data API v3 is not enabled for this Google Cloud project.")
-            return None
-        if "forbidden" in msg or "403" in msg:
-            st.error("Request forbidden (403). Video may be restricted/private or comments unavailable.")
-            return None
-
-        st.error(f"Error fetching data: {msg}")
+        st.error(fetch_error_message(e))
+        return None
+    return resolved, infos
+
+def scored_entry(vid, data=None):
+    # Cache entry {"raw", "hash", "df", "agg"} for a video's scored comments.
+    # The raw frame object is checked first so a rerun over unchanged data
+    # costs nothing per comment; the content hash covers reloaded frames.
+    if data is None:
+        data = st.session_state.video_data.get(vid)
+    if data and data.get("spilled"):
+        data = restore_video(vid)
+    if not data:
         return None
 
-def analyze_sentiment(df):
+    df = data["df"]
     if df is None or df.empty:
-        return df
+        return None
 
-    out = df.copy()
-    out["sentiment_score"] = out["comment"].apply(lambda x: TextBlob(str(x)).sentiment.polarity)
-    out["sentiment"] = out["sentiment_score"].apply(
-        lambda x: "Positive" if x > 0.1 else "Negative" if x < -0.1 else "Neutral"
+    cached = st.session_state.scored_cache.get(vid)
+    if cached and cached.get("spilled"):
+        # Refreshed while spilled; the shared cache usually has the scores.
+        session_memory.remove_spill(st.session_state.session_id, vid)
+        cached = None
+    if cached and cached.get("raw") is df:
+        st.session_state.scored_stats["hits"] += 1
+        return cached
+
+    key = comments_hash(df)
+    if cached and cached["hash"] == key:
+        st.session_state.scored_stats["hits"] += 1
+        cached["raw"] = df
+        return cached
+
+    st.session_state.scored_stats["misses"] += 1
+
+    def score():
+        entry = extend_scored(cached, df) if cached else None
+        if entry is None:
+            out = analyze_sentiment(df)
+            entry = {"df": out, "agg": sentiment_aggregate(out)}
+        return entry
+
+    # Scored frames are shared across sessions by content hash; each session
+    # gets its own entry (explore views, exports) around the shared frame.
+    shared = shared_cache.VIDEOS.load(("scored", vid, key), score, sizeof=scored_bytes)
+    entry = {"df": shared["df"], "agg": shared["agg"], "timeline": dict(shared.get("timeline", {})), "raw": df, "hash": key}
+    st.session_state.scored_cache[vid] = entry
+    return entry
+
+def scored_bytes(entry):
+    # Only the score columns: the comment buffers are the raw frame's.
+    cols = [c for c in SCORE_COLUMNS if c in entry["df"]]
+    return int(entry["df"][cols].memory_usage(index=False, deep=True).sum())
+
+def extend_scored(cached, df):
+    # A refresh only adds comments: score just the new ones and fold them
+    # into the previous aggregate. Anything else is rescored from scratch.
+    old = cached["df"]
+    is_new = ~df["comment_id"].isin(old["comment_id"]).to_numpy()
+    if len(df) - is_new.sum() != len(old) or not is_new.any():
+        return None
+
+    added = analyze_sentiment(df[is_new])
+    scores = pd.concat(
+        [
+            pd.Series(old["sentiment_score"].to_numpy(), index=old["comment_id"]),
+            pd.Series(added["sentiment_score"].to_numpy(), index=added["comment_id"]),
+        ]
     )
+    # Groups can span old and new comments, so they are rebuilt in full.
+    out = with_scores(df, scores.reindex(df["comment_id"]).to_numpy(), duplicate_groups(df))
+    timelines = {
+        freq: merge_timelines(freq, buckets, timeline_buckets(added, freq))
+        for freq, buckets in cached.get("timeline", {}).items()
+    }
+    return {"df": out, "agg": merge_aggregates(cached["agg"], sentiment_aggregate(added)), "timeline": timelines}
+
+def scored_video(vid, data=None):
+    entry = scored_entry(vid, data)
+    if entry is None:
+        data = data or st.session_state.video_data.get(vid)
+        return data["df"] if data else None
+    return entry["df"]
+
+def explore_index(entry):
+    # Built once per scored frame and kept in its cache entry: sort
+    # permutations per sort option, a row mask per label and filtered views,
+    # all as row positions, so paging is an index slice.
+    index = entry.get("explore")
+    if index is None:
+        df = entry["df"]
+        depth = df["depth"].to_numpy() if "depth" in df.columns else np.zeros(len(df), dtype="int8")
+        index = entry["explore"] = {
+            "orders": {},
+            "masks": {},
+            "views": {},
+            "top_level": depth == 0,
+            "has_replies": bool((depth > 0).any()),
+        }
+    return index
+
+def explore_order(entry, sort_by):
+    index = explore_index(entry)
+    order = index["orders"].get(sort_by)
+    if order is None:
+        col, asc = EXPLORE_SORTS[sort_by]
+        values = entry["df"][col].reset_index(drop=True)
+        order = values.sort_values(ascending=asc, kind="stable").index.to_numpy()
+        index["orders"][sort_by] = order
+    return order
+
+def label_mask(entry, label):
+    index = explore_index(entry)
+    mask = index["masks"].get(label)
+    if mask is None:
+        mask = index["masks"][label] = (entry["df"]["sentiment"] == label).to_numpy()
+    return mask
+
+def explore_rows(entry, sort_by, labels, include_replies):
+    index = explore_index(entry)
+    key = (sort_by, tuple(sorted(labels)), include_replies)
+    rows = index["views"].pop(key, None)
+    if rows is None:
+        keep = np.zeros(len(entry["df"]), dtype=bool)
+        for label in labels:
+            keep |= label_mask(entry, label)
+        if not include_replies:
+            keep &= index["top_level"]
+        order = explore_order(entry, sort_by)
+        rows = order[keep[order]]
+    index["views"][key] = rows
+    while len(index["views"]) > EXPLORE_VIEW_CACHE:
+        index["views"].pop(next(iter(index["views"])))
+    return rows
+
+def search_hits(vid, entry, query, clauses):
+    # Row mask of comments matching the query, kept per query in the
+    # explore index of the scored frame.
+    index = explore_index(entry)
+    hits = index.setdefault("hits", {})
+    mask = hits.pop(query, None)
+    if mask is None:
+        df = entry["df"]
+        if "ids" not in index:
+            index["ids"] = pd.Index(df["comment_id"])
+        ids = video_index(vid, df).search(clauses)
+        pos = index["ids"].get_indexer(ids)
+        mask = np.zeros(len(df), dtype=bool)
+        mask[pos[pos >= 0]] = True
+    hits[query] = mask
+    while len(hits) > EXPLORE_VIEW_CACHE:
+        hits.pop(next(iter(hits)))
+    return mask
+
+def search_rows(vid, entry, rows, query, clauses):
+    mask = search_hits(vid, entry, query, clauses)
+    return rows[mask[rows]]
+
+def search_all(query, clauses, sort_by, labels, include_replies):
+    # Matches across every added video as one frame, sorted like a single
+    # video's view. Reused while the query, filters and data stay the same.
+    entries = [(vid, scored_entry(vid)) for vid in st.session_state.current_videos]
+    entries = [(vid, e) for vid, e in entries if e is not None]
+    key = (query, sort_by, tuple(sorted(labels)), include_replies, tuple((vid, id(e["df"])) for vid, e in entries))
+    cached = st.session_state.get("search_results")
+    if cached and cached[0] == key:
+        return cached[1]
+
+    frames = []
+    for vid, entry in entries:
+        rows = search_rows(vid, entry, explore_rows(entry, sort_by, labels, include_replies), query, clauses)
+        if len(rows):
+            title = st.session_state.video_data.get(vid, {}).get("title", vid)
+            frames.append(entry["df"].iloc[rows].assign(video=title))
+    if frames:
+        col, asc = EXPLORE_SORTS[sort_by]
+        out = pd.concat(frames, ignore_index=True).sort_values(col, ascending=asc, kind="stable")
+    else:
+        out = None
+    st.session_state.search_results = (key, out)
     return out
 
+def video_timeline(vid, freq, data=None):
+    # Bucketed sums per granularity, kept in the scored cache entry and
+    # extended by extend_scored when new comments arrive.
+    stub = spilled_entry(vid)
+    if stub is not None and freq in stub["timeline"]:
+        return stub["timeline"][freq]
+    entry = scored_entry(vid, data)
+    if entry is None:
+        return None
+    timelines = entry.setdefault("timeline", {})
+    if freq not in timelines:
+        with metrics.timer("timeline_buckets"):
+            timelines[freq] = timeline_buckets(entry["df"], freq)
+    return timelines[freq]
+
+def video_aggregate(vid, data=None, once=False):
+    # once: over one comment per duplicate group, built on first use.
+    key = "agg_once" if once else "agg"
+    stub = spilled_entry(vid)
+    if stub is not None and key in stub:
+        return stub[key]
+    entry = scored_entry(vid, data)
+    if entry is None:
+        return None
+    if key not in entry:
+        entry[key] = sentiment_aggregate(collapse_duplicates(entry["df"]))
+    return entry[key]
+
+def spilled_entry(vid):
+    # Aggregates and timelines of a spilled video stay in memory, so totals,
+    # Compare and Timeline do not read it back from disk.
+    data = st.session_state.video_data.get(vid)
+    entry = st.session_state.scored_cache.get(vid)
+    if data and data.get("spilled") and entry and entry.get("spilled"):
+        return entry
+    return None
+
+def video_bytes(vid):
+    data = st.session_state.video_data.get(vid)
+    if not data or data.get("spilled"):
+        return 0
+    entry = st.session_state.scored_cache.get(vid)
+    extra = scored_bytes(entry) if entry and entry.get("raw") is data["df"] else 0
+    return data.get("memory_bytes", 0) + extra
+
+def viewed_video(vid):
+    lru = st.session_state.video_lru
+    if vid in lru:
+        lru.remove(vid)
+    lru.append(vid)
+    data = st.session_state.video_data.get(vid)
+    if data and data.get("spilled"):
+        data = restore_video(vid)
+    return data
+
+@metrics.timed("spill_video")
+def spill_video(vid):
+    # Writes the scored frame (or the raw one if never scored) to disk and
+    # keeps only metadata, the aggregate, timelines and weak references, so
+    # a frame still alive in the shared cache comes back without a read.
+    data = st.session_state.video_data[vid]
+    entry = st.session_state.scored_cache.get(vid)
+    scored = entry is not None and entry.get("raw") is data["df"]
+    frame = entry["df"] if scored else data["df"]
+    path = session_memory.spill_path(st.session_state.session_id, vid)
+    # A video restored and not changed since is still on disk.
+    if data.get("on_disk") != (path, scored) or not os.path.exists(path):
+        session_memory.spill_frame(frame, path)
+
+    refs = (weakref.ref(data["df"]), weakref.ref(frame))
+    st.session_state.video_data[vid] = {**data, "df": None, "rows": len(frame), "spilled": path, "refs": refs}
+    if scored:
+        st.session_state.scored_cache[vid] = {
+            "spilled": path,
+            "agg": entry["agg"],
+            "timeline": entry.get("timeline", {}),
+            "hash": entry["hash"],
+            **({"agg_once": entry["agg_once"]} if "agg_once" in entry else {}),
+        }
+    else:
+        st.session_state.scored_cache.pop(vid, None)
+    st.session_state.search_indexes.pop(vid, None)
+
+@metrics.timed("restore_video")
+def restore_video(vid):
+    data = st.session_state.video_data[vid]
+    stub = st.session_state.scored_cache.get(vid)
+    stub = stub if stub and stub.get("spilled") else None
+    raw, frame = (r() for r in data["refs"])
+    if raw is None or (stub and frame is None):
+        frame = session_memory.load_frame(data["spilled"])
+        raw = frame.drop(columns=SCORE_COLUMNS, errors="ignore") if stub else frame
+
+    payload = {k: v for k, v in data.items() if k not in ("rows", "spilled", "refs")}
+    payload.update(df=raw, on_disk=(data["spilled"], stub is not None))
+    st.session_state.video_data[vid] = payload
+    if stub:
+        st.session_state.scored_cache[vid] = {
+            "raw": raw,
+            "df": frame,
+            "agg": stub["agg"],
+            "timeline": stub["timeline"],
+            "hash": stub["hash"],
+            **({"agg_once": stub["agg_once"]} if "agg_once" in stub else {}),
+        }
+    return payload
+
+def release_memory():
+    # Spill least recently viewed videos until the session fits its budget;
+    # the most recently viewed one always stays in memory.
+    videos = st.session_state.current_videos
+    lru = [v for v in st.session_state.video_lru if v in videos]
+    order = [v for v in videos if v not in lru] + lru
+    used = sum(video_bytes(v) for v in videos)
+    for vid in order[:-1]:
+        if used <= session_memory.MEMORY_BUDGET:
+            break
+        size = video_bytes(vid)
+        if size:
+            try:
+                spill_video(vid)
+            except Exception:
+                continue
+            used -= size
+    register_session()
+
+def drop_scored(vid=None):
+    if vid is None:
+        st.session_state.scored_cache = {}
+    else:
+        st.session_state.scored_cache.pop(vid, None)
+
+def finish_stream(stream, complete):
+    if not stream["columns"]["comment_id"]:
+        return None
+
+    vid = stream["vid"]
+    depth = fetch_depth(stream["columns"], stream["max_comments"]) if complete else None
+    if complete:
+        try:
+            comment_store.save_video(
+                vid,
+                stream["title"],
+                stream["url"],
+                stream["stats"],
+                stream["columns"],
+                fetch_limit=depth,
+                fetch_replies=stream["replies"],
+            )
+        except Exception:
+            pass
+
+    df = comments_frame(stream["columns"])
+    payload = video_payload(
+        df,
+        stream["title"],
+        stream["url"],
+        stream["stats"],
+        partial=not complete,
+        fetch_limit=depth,
+        fetch_replies=stream["replies"],
+    )
+    st.session_state.video_data[vid] = payload
+
+    # Pages were scored as they arrived; seed the cache so nothing is rescored.
+    scored = with_scores(df, stream["scores"], duplicate_groups(df))
+    entry = st.session_state.scored_cache[vid] = {
+        "raw": df,
+        "hash": comments_hash(df),
+        "df": scored,
+        "agg": sentiment_aggregate(scored),
+    }
+    if complete:
+        shared_cache.VIDEOS.put(vid, payload, payload_bytes(payload))
+        shared_cache.VIDEOS.put(("scored", vid, entry["hash"]), {"df": scored, "agg": entry["agg"]}, scored_bytes(entry))
+    return payload
+
+@metrics.timed("stream_video")
+def stream_video(video_id, video_url):
+    if not check_quota(fetch_units()):
+        return None
+
+    yt = youtube_client()
+    if yt is None:
+        return None
+
+    try:
+        title, stats = video_info(yt, video_id)
+    except Exception as e:
+        st.error(fetch_error_message(e))
+        return None
+
+    stream = {
+        "vid": video_id,
+        "url": video_url,
+        "title": title,
+        "stats": stats,
+        "max_comments": comment_limit(),
+        "replies": st.session_state.get("fetch_replies", False),
+        "columns": new_comment_columns(),
+        "scores": [],
+    }
+    st.session_state.streaming = stream
+
+    st.markdown(
+        f"""
+        <div class="card">
+            <div style="font-size:16px; font-weight:800;">Fetching comments</div>
+            <div class="subtitle">{title}</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+    st.button("Stop and keep fetched comments", key="stop_stream", use_container_width=True)
+    s1, s2 = st.columns([1, 1.25])
+    with s1:
+        count_box = st.empty()
+        mix_box = st.empty()
+    with s2:
+        chart_box = st.empty()
+
+    counts = pd.Series(0, index=sentiment_engine.SENTIMENT_LABELS)
+    complete = True
+    try:
+        pages = iter_comment_pages(
+            yt,
+            video_id,
+            max_comments=stream["max_comments"],
+            replies=stream["replies"],
+        )
+        for n, page in enumerate(pages):
+            if not page["comment_id"]:
+                continue
+            scores = sentiment_engine.polarity(pd.Series(page["comment"], dtype=object))
+            extend_columns(stream["columns"], page)
+            index_comments(video_id, page["comment_id"], page["comment"])
+            stream["scores"].extend(scores.tolist())
+            counts = counts.add(pd.Series(sentiment_engine.labels(scores)).value_counts(), fill_value=0)
+
+            total = len(stream["columns"]["comment_id"])
+            count_box.markdown(
+                f"<div class='metric'><div class='metric-k'>Comments so far</div><div class='metric-v'>{total:,}</div></div>",
+                unsafe_allow_html=True,
+            )
+            mix_box.markdown(
+                " ".join(f"{sentiment_badge(k)} {counts[k] / total * 100:.0f}%" for k in counts.index),
+                unsafe_allow_html=True,
+            )
+            live = counts[counts > 0]
+            chart_box.plotly_chart(
+                donut_chart(live, "Sentiment so far", f"{total:,}<br>comments"),
+                use_container_width=True,
+                key=f"stream_donut_{n}",
+            )
+    except Exception as e:
+        complete = False
+        st.error(fetch_error_message(e))
+
+    st.session_state.pop("streaming", None)
+    if not stream["columns"]["comment_id"]:
+        st.error("No comments returned. Comments may be disabled for this video.")
+        return None
+    return finish_stream(stream, complete)
+
+@metrics.timed("donut_chart")
 def donut_chart(sentiment_counts, title, center_text):
+    import plotly.graph_objects as go
+
     labels = list(sentiment_counts.index)
     values = list(sentiment_counts.values)
 
@@ -499,29 +1178,133 @@ def donut_chart(sentiment_counts, title, center_text):
     )
     return fig
 
-def build_comparison(video_ids):
+@metrics.timed("build_comparison")
+def build_comparison(video_ids, once=False):
     rows = []
     for vid in video_ids:
         data = st.session_state.video_data.get(vid)
         if not data:
             continue
-        df = analyze_sentiment(data["df"])
-        if df is None or df.empty:
+        agg = video_aggregate(vid, data, once)
+        if not agg or not agg["count"]:
             continue
 
-        rows.append(
-            {
-                "Video": data["title"][:55],
-                "Total Comments": len(df),
-                "Positive %": (df["sentiment"] == "Positive").mean() * 100,
-                "Neutral %": (df["sentiment"] == "Neutral").mean() * 100,
-                "Negative %": (df["sentiment"] == "Negative").mean() * 100,
-                "Avg Sentiment": df["sentiment_score"].mean(),
-            }
-        )
+        rows.append(comparison_row(data["title"], agg))
+
+    return pd.DataFrame(rows) if rows else None
 
+@metrics.timed("build_collections")
+def build_collections(once=False):
+    # One row per added channel or playlist over its videos still selected.
+    rows = []
+    for source in st.session_state.collections.values():
+        aggs = {}
+        for vid in source["video_ids"]:
+            data = st.session_state.video_data.get(vid)
+            if vid in st.session_state.current_videos and data:
+                aggs[vid] = (data["title"], video_aggregate(vid, data, once))
+        if any(a and a["count"] for _, a in aggs.values()):
+            rows.append(collection_row(source["title"], aggs))
     return pd.DataFrame(rows) if rows else None
 
+@metrics.timed("comparison_chart")
+def comparison_chart(comp):
+    import plotly.express as px
+
+    fig = px.bar(
+        comp,
+        x="Video",
+        y=["Positive %", "Neutral %", "Negative %"],
+        barmode="group",
+        title="Sentiment by video",
+        color_discrete_map={
+            "Positive %": SENTIMENT_COLORS["Positive"],
+            "Neutral %": SENTIMENT_COLORS["Neutral"],
+            "Negative %": SENTIMENT_COLORS["Negative"],
+        },
+    )
+    fig.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color=THEME["text"]),
+        title_font=dict(color=THEME["text"]),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="left", x=0),
+    )
+    return fig
+
+@metrics.timed("timeline_chart")
+def timeline_chart(series, window, volume):
+    # series: {name: rolling_timeline frame}; volume: the frame whose
+    # comment counts are drawn as bars under the sentiment lines.
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.62, 0.38], vertical_spacing=0.06)
+    for name, tl in series.items():
+        fig.add_trace(
+            go.Scatter(
+                x=tl.index,
+                y=tl["Avg Sentiment"],
+                name=name[:40],
+                mode="lines",
+                connectgaps=True,
+                line=dict(width=3 if name == "All videos" else 1.6),
+            ),
+            row=1,
+            col=1,
+        )
+    fig.add_trace(
+        go.Bar(x=volume.index, y=volume["Comments"], name="Comments", marker=dict(color=THEME["neutral"]), opacity=0.45),
+        row=2,
+        col=1,
+    )
+    if window > 1:
+        fig.add_trace(
+            go.Scatter(
+                x=volume.index,
+                y=volume["Rolling Comments"],
+                name=f"Comments ({window}-bucket mean)",
+                mode="lines",
+                line=dict(color=THEME["accent"], width=2),
+            ),
+            row=2,
+            col=1,
+        )
+    fig.update_yaxes(title_text="Sentiment", row=1, col=1)
+    fig.update_yaxes(title_text="Comments", row=2, col=1)
+    fig.update_layout(
+        height=560,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color=THEME["text"]),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.25, xanchor="left", x=0),
+        margin=dict(t=20),
+    )
+    return fig
+
+def finish_rerun():
+    metrics.observe("rerun", time.perf_counter() - RERUN_STARTED)
+    metrics.write_prometheus()
+
+def render_diagnostics():
+    with st.expander("Diagnostics", expanded=False):
+        st.caption(f"Stage timings • Prometheus text written to {metrics.METRICS_FILE}")
+        fmt = {k: "{:,.1f}" for k in ["Mean ms", "p50 ms", "p95 ms", "p99 ms", "Max ms"]}
+        fmt["Total s"] = "{:,.2f}"
+        shared = shared_cache.VIDEOS.summary()
+        st.caption(
+            f"Shared cache • {shared['entries']} entries • {shared['bytes'] / 1e6:,.1f} of {shared_cache.MAX_BYTES / 1e6:,.0f} MB • "
+            f"{shared['hits']} hits • {shared['misses']} misses • {shared['waits']} joined in-flight loads • "
+            f"{shared['evictions']} evicted • {shared['expired']} expired"
+        )
+        for label, registry in [("This session", st.session_state.stage_metrics), ("All sessions", metrics.PROCESS)]:
+            rows = registry.summary()
+            st.markdown(f"**{label}**")
+            if rows:
+                st.dataframe(pd.DataFrame(rows).style.format(fmt), use_container_width=True, hide_index=True)
+            else:
+                st.caption("No timings yet.")
+
 def sentiment_badge(s):
     c = SENTIMENT_COLORS.get(s, THEME["neutral"])
     return f"""
@@ -572,9 +1355,28 @@ with top3:
 
 st.markdown("")
 
+# A rerun while a stream is still registered means it was interrupted
+# (Stop button or any other interaction): keep the pages fetched so far.
+if "streaming" in st.session_state:
+    stream = st.session_state.pop("streaming")
+    if finish_stream(stream, complete=False) and stream["vid"] not in st.session_state.current_videos:
+        st.session_state.current_videos.append(stream["vid"])
+        st.info(f"Fetch stopped. Kept {len(stream['columns']['comment_id']):,} comments.")
+
+pending_stream = None
 a1, a2 = st.columns([3, 1])
 with a1:
     video_url = st.text_input("YouTube video URL", placeholder="https://www.youtube.com/watch?v=...")
+    stream_fetch = st.checkbox("Show results while comments are fetched", key="stream_fetch")
+    st.number_input(
+        "Max comments per video",
+        min_value=100,
+        max_value=MAX_COMMENTS_CEILING,
+        value=min(MAX_COMMENTS, MAX_COMMENTS_CEILING),
+        step=500,
+        key="max_comments",
+    )
+    st.checkbox("Include reply threads", key="fetch_replies")
 
 with a2:
     if st.button("Add video", use_container_width=True):
@@ -588,6 +1390,8 @@ with a2:
             else:
                 if vid in st.session_state.current_videos:
                     st.warning("That video is already added.")
+                elif stream_fetch and cached_video(vid, url) is None:
+                    pending_stream = (vid, url)
                 else:
                     with st.spinner("Fetching video data..."):
                         data = fetch_video(vid, url)
@@ -596,19 +1400,118 @@ with a2:
                         st.success("Video added.")
                         safe_rerun()
 
+if pending_stream:
+    data = stream_video(*pending_stream)
+    if data:
+        st.session_state.current_videos.append(pending_stream[0])
+        st.success("Video added.")
+        safe_rerun()
+
+with st.expander("Add many videos", expanded=False):
+    bulk_text = st.text_area(
+        "YouTube video URLs",
+        placeholder="One URL per line, or separated by commas",
+        height=120,
+    )
+    bulk_file = st.file_uploader("Or upload a file of URLs", type=["txt", "csv"])
+
+    if st.button("Add all", use_container_width=True):
+        raw = bulk_text or ""
+        if bulk_file is not None:
+            raw += "\n" + bulk_file.getvalue().decode("utf-8", errors="ignore")
+
+        items, invalid = parse_video_urls(raw)
+        items = [(vid, url) for vid, url in items if vid not in st.session_state.current_videos]
+
+        for token in invalid[:10]:
+            st.warning(f"Skipped, not a YouTube video link: {token[:80]}")
+
+        if not items:
+            st.info("No new videos to add.")
+        else:
+            failed = add_videos(items)
+            added = len(items) - len(failed)
+            if added < len(items) or invalid:
+                for vid, msg in failed.items():
+                    st.error(f"{vid}: {msg}")
+                st.success(f"Added {added} of {len(items)} videos.")
+            else:
+                st.success(f"Added {len(items)} videos.")
+                safe_rerun()
+
+with st.expander("Add a channel or playlist", expanded=False):
+    source_url = st.text_input(
+        "YouTube channel or playlist URL",
+        placeholder="https://www.youtube.com/@channel or https://www.youtube.com/playlist?list=...",
+    )
+    s1, s2 = st.columns(2)
+    with s1:
+        source_days = st.number_input(
+            "Videos from the last N days (0 = all)", min_value=0, max_value=3650, value=CHANNEL_DAYS, step=30
+        )
+    with s2:
+        source_limit = st.number_input(
+            "Max videos", min_value=1, max_value=max(CHANNEL_MAX_VIDEOS, 1000), value=CHANNEL_MAX_VIDEOS, step=50
+        )
+
+    if st.button("Add channel or playlist", use_container_width=True):
+        source = extract_source(source_url)
+        if not source:
+            st.error("That does not look like a YouTube channel or playlist link.")
+        else:
+            listed = list_source(source, int(source_days), int(source_limit))
+            if listed:
+                resolved, infos = listed
+                items = [
+                    (vid, f"https://www.youtube.com/watch?v={vid}")
+                    for vid in infos
+                    if vid not in st.session_state.current_videos
+                ]
+                failed = add_videos(items, infos) if items else {}
+                st.session_state.collections[resolved["id"]] = {
+                    "title": resolved["title"],
+                    "kind": resolved["kind"],
+                    "video_ids": [vid for vid in infos if vid in st.session_state.current_videos],
+                }
+                if not infos:
+                    st.info("No videos with comments in that range.")
+                elif failed:
+                    for vid, msg in failed.items():
+                        st.error(f"{vid}: {msg}")
+                    st.success(f"Added {len(items) - len(failed)} of {len(items)} videos from {resolved['title']}.")
+                else:
+                    st.success(f"Added {len(infos)} videos from {resolved['title']}.")
+                    safe_rerun()
+
 if st.session_state.current_videos:
     with st.expander("Selected videos", expanded=False):
         for vid in st.session_state.current_videos:
             data = st.session_state.video_data.get(vid, {})
             name = data.get("title", vid)
-            r1, r2 = st.columns([5, 1])
+            if data.get("partial"):
+                name += " (partial)"
+            if data.get("spilled"):
+                name += f" • {data['rows']:,} comments • on disk"
+            elif data:
+                name += f" • {len(data['df']):,} comments • {data.get('memory_bytes', 0) / 1e6:.1f} MB"
+            r1, r2, r3 = st.columns([4, 1, 1])
             with r1:
                 st.write(name)
             with r2:
+                if st.button("Refresh", key=f"rf_{vid}", use_container_width=True):
+                    before = data.get("rows", 0) if data.get("spilled") else len(data["df"]) if data else 0
+                    with st.spinner("Fetching new comments..."):
+                        fresh = fetch_video(vid, data.get("url"), refresh=True)
+                    if fresh:
+                        st.success(f"{len(fresh['df']) - before:,} new comments.")
+            with r3:
                 if st.button("Remove", key=f"rm_{vid}", use_container_width=True):
                     st.session_state.current_videos.remove(vid)
                     if vid in st.session_state.video_data:
                         del st.session_state.video_data[vid]
+                    drop_scored(vid)
+                    drop_index(vid)
+                    session_memory.remove_spill(st.session_state.session_id, vid)
                     safe_rerun()
 
 cbtn1, cbtn2 = st.columns([1, 5])
@@ -617,6 +1520,10 @@ with cbtn1:
         if st.button("Clear all", use_container_width=True):
             st.session_state.current_videos = []
             st.session_state.video_data = {}
+            st.session_state.collections = {}
+            drop_scored()
+            drop_index()
+            session_memory.remove_spill(st.session_state.session_id)
             safe_rerun()
 
 st.markdown("")
@@ -634,22 +1541,15 @@ if not st.session_state.current_videos:
         """,
         unsafe_allow_html=True,
     )
+    release_memory()
+    finish_rerun()
     st.stop()
 
 total_videos = len(st.session_state.current_videos)
-total_comments = 0
-scores = []
-
-for vid in st.session_state.current_videos:
-    data = st.session_state.video_data.get(vid)
-    if not data:
-        continue
-    total_comments += len(data["df"])
-    df0 = analyze_sentiment(data["df"])
-    if df0 is not None and not df0.empty:
-        scores.extend(df0["sentiment_score"].tolist())
-
-avg_sent = float(np.mean(scores)) if scores else 0.0
+aggs = [video_aggregate(vid) for vid in st.session_state.current_videos]
+overall = merge_aggregates(*(a for a in aggs if a))
+total_comments = overall["count"]
+avg_sent = average_score(overall)
 
 m1, m2, m3 = st.columns(3)
 with m1:
@@ -661,26 +1561,31 @@ with m3:
 
 st.markdown("")
 
-tabs = st.tabs(["Overview", "Explore", "Compare", "Export"])
-
-with tabs[0]:
+def render_overview():
     vid = st.selectbox(
         "Video",
         options=st.session_state.current_videos,
         format_func=lambda x: st.session_state.video_data.get(x, {}).get("title", x)[:70],
         key="ov_vid",
     )
-    data = st.session_state.video_data.get(vid)
+    data = viewed_video(vid)
     if not data:
         st.info("Video data missing. Re-add the video.")
-        st.stop()
-
-    df = analyze_sentiment(data["df"])
+        return
+
+    df = scored_video(vid, data)
+    if has_replies(df):
+        df = filter_replies(df, st.checkbox("Include replies", value=True, key="ov_replies"))
+    if st.checkbox("Count each duplicate group once", key="ov_once"):
+        dups = duplicate_count(df)
+        df = collapse_duplicates(df)
+        st.caption(f"{dups:,} duplicate or near-duplicate comments left out")
     if df is None or df.empty:
         st.info("No comments to analyze.")
-        st.stop()
+        return
 
     s_counts = df["sentiment"].value_counts()
+    s_counts = s_counts[s_counts > 0]
     dom = s_counts.idxmax()
     dom_pct = (s_counts.max() / len(df)) * 100
     center = f"{dom}<br>{dom_pct:.0f}%"
@@ -710,53 +1615,78 @@ with tabs[0]:
             unsafe_allow_html=True,
         )
 
-        recent = df.sort_values("published_at", ascending=False).head(8)
-        for _, row in recent.iterrows():
-            txt = str(row.get("comment", "")).strip()
-            if len(txt) > 180:
-                txt = txt[:180] + "..."
-
-            when = row.get("published_at")
-            when_txt = ""
-            if pd.notna(when):
-                when_txt = pd.to_datetime(when).strftime("%Y-%m-%d %H:%M")
-
-            badge = sentiment_badge(row["sentiment"])
-            likes = int(row.get("like_count", 0) or 0)
-
-            st.markdown(
-                f"""
-                <div class="card-soft" style="margin-top: 10px;">
-                    <div style="display:flex; justify-content:space-between; align-items:center; gap:10px;">
-                        <div>{badge}</div>
-                        <div class="muted" style="font-size:12px;">{when_txt}</div>
-                    </div>
-                    <div style="margin-top: 10px; font-size: 13px; line-height:1.55;">{txt}</div>
-                    <div class="muted" style="margin-top: 8px; font-size:12px;">
-                        {row.get('author','Unknown')}
-                        {" • " + str(likes) + " likes" if likes > 0 else ""}
+        with metrics.timer("recent_comments"):
+            recent = df.sort_values("published_at", ascending=False).head(8)
+            for _, row in recent.iterrows():
+                txt = str(row.get("comment", "")).strip()
+                if len(txt) > 180:
+                    txt = txt[:180] + "..."
+
+                when = row.get("published_at")
+                when_txt = ""
+                if pd.notna(when):
+                    when_txt = pd.to_datetime(when).strftime("%Y-%m-%d %H:%M")
+
+                badge = sentiment_badge(row["sentiment"])
+                likes = int(row.get("like_count", 0) or 0)
+
+                st.markdown(
+                    f"""
+                    <div class="card-soft" style="margin-top: 10px;">
+                        <div style="display:flex; justify-content:space-between; align-items:center; gap:10px;">
+                            <div>{badge}</div>
+                            <div class="muted" style="font-size:12px;">{when_txt}</div>
+                        </div>
+                        <div style="margin-top: 10px; font-size: 13px; line-height:1.55;">{txt}</div>
+                        <div class="muted" style="margin-top: 8px; font-size:12px;">
+                            {row.get('author','Unknown')}
+                            {" • " + str(likes) + " likes" if likes > 0 else ""}
+                        </div>
                     </div>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
+                    """,
+                    unsafe_allow_html=True,
+                )
 
-with tabs[1]:
+def render_explore():
     vid = st.selectbox(
         "Video",
         options=st.session_state.current_videos,
         format_func=lambda x: st.session_state.video_data.get(x, {}).get("title", x)[:70],
         key="ex_vid",
     )
-    data = st.session_state.video_data.get(vid)
+    data = viewed_video(vid)
     if not data:
         st.info("Video data missing. Re-add the video.")
-        st.stop()
+        return
 
-    df = analyze_sentiment(data["df"])
-    if df is None or df.empty:
+    entry = scored_entry(vid, data)
+    if entry is None:
         st.info("No comments to analyze.")
-        st.stop()
+        return
+
+    include_replies = True
+    if explore_index(entry)["has_replies"]:
+        include_replies = st.checkbox("Include replies", value=True, key="ex_replies")
+
+    q1, q2 = st.columns([3, 1])
+    with q1:
+        query = st.text_input(
+            "Search comments",
+            key="ex_query",
+            placeholder='great OR love   "not good"   amaz*',
+        ).strip()
+    with q2:
+        search_everywhere = False
+        if len(st.session_state.current_videos) > 1:
+            st.markdown('<div style="height: 1.9rem;"></div>', unsafe_allow_html=True)
+            search_everywhere = st.checkbox("Search all videos", key="ex_all")
+
+    clauses = []
+    if query:
+        try:
+            clauses = search_index.parse_query(query)
+        except search_index.QueryError as e:
+            st.warning(str(e))
 
     f1, f2, f3 = st.columns([1.3, 1.3, 1])
     with f1:
@@ -766,42 +1696,154 @@ with tabs[1]:
             default=["Positive", "Neutral", "Negative"],
         )
     with f2:
-        sort_by = st.selectbox(
-            "Sort by",
-            options=["Newest", "Oldest", "Most Likes", "Highest Sentiment", "Lowest Sentiment"],
-        )
+        sort_by = st.selectbox("Sort by", options=list(EXPLORE_SORTS))
     with f3:
-        n_show = st.slider("Rows", 10, 80, 20)
+        page_size = st.selectbox("Rows per page", options=EXPLORE_PAGE_SIZES, key="ex_page_size")
 
-    filtered = df[df["sentiment"].isin(sentiment_filter)]
+    with metrics.timer("explore_search" if clauses else "explore_rows"):
+        if clauses and search_everywhere:
+            found = search_all(query, clauses, sort_by, sentiment_filter, include_replies)
+            total = 0 if found is None else len(found)
+        else:
+            rows = explore_rows(entry, sort_by, sentiment_filter, include_replies)
+            if clauses:
+                rows = search_rows(vid, entry, rows, query, clauses)
+            total = len(rows)
+    pages = max(1, -(-total // page_size))
+
+    # A new query, filter, sort or video starts again from the first page.
+    view = (vid, query, search_everywhere, sort_by, tuple(sentiment_filter), include_replies, page_size)
+    if st.session_state.get("ex_view") != view:
+        st.session_state.ex_view = view
+        st.session_state.ex_page = 1
+    st.session_state.ex_page = min(st.session_state.get("ex_page", 1), pages)
+
+    start = (st.session_state.ex_page - 1) * page_size
+    if clauses and search_everywhere:
+        show = found.iloc[start:start + page_size] if total else entry["df"].iloc[:0]
+    else:
+        show = entry["df"].iloc[rows[start:start + page_size]]
+
+    if clauses:
+        search_results(show, search_index.highlight_pattern(clauses), search_everywhere)
+    else:
+        show = show[["published_at", "author", "like_count", "sentiment", "sentiment_score", "comment"]].assign(
+            published_at=show["published_at"].dt.strftime("%Y-%m-%d %H:%M")
+        )
+        st.dataframe(show, use_container_width=True, height=520, hide_index=True)
+
+    p1, p2 = st.columns([3, 1])
+    with p1:
+        if total:
+            st.caption(f"Showing {start + 1:,}–{start + len(show):,} of {total:,} comments • page {st.session_state.ex_page} of {pages:,}")
+        elif clauses:
+            st.caption("No comments match the search.")
+        else:
+            st.caption("No comments match the filter.")
+    with p2:
+        st.number_input("Page", min_value=1, max_value=pages, step=1, key="ex_page")
+
+def search_results(show, pattern, with_video):
+    # One markdown block per page; only the visible rows are highlighted.
+    cards = []
+    for row in show.itertuples(index=False):
+        when = row.published_at.strftime("%Y-%m-%d %H:%M") if pd.notna(row.published_at) else ""
+        likes = int(row.like_count or 0)
+        source = f"{search_index.highlight(row.video[:70], None)} • " if with_video else ""
+        cards.append(
+            '<div class="card-soft" style="margin-top: 10px;">'
+            '<div style="display:flex; justify-content:space-between; align-items:center; gap:10px;">'
+            f'<div>{sentiment_badge(row.sentiment)} <span class="muted" style="font-size:12px;">{row.sentiment_score:.2f}</span></div>'
+            f'<div class="muted" style="font-size:12px;">{when}</div>'
+            "</div>"
+            f'<div style="margin-top: 10px; font-size: 13px; line-height:1.55;">{search_index.highlight(row.comment, pattern).replace(chr(10), "<br>")}</div>'
+            f'<div class="muted" style="margin-top: 8px; font-size:12px;">{source}{search_index.highlight(row.author, None)}'
+            f'{" • " + str(likes) + " likes" if likes > 0 else ""}</div>'
+            "</div>"
+        )
+    if cards:
+        st.markdown("".join(cards), unsafe_allow_html=True)
+
+def render_timeline():
+    t1, t2, t3 = st.columns([1.2, 1.2, 1.6])
+    with t1:
+        granularity = st.radio("Granularity", list(TIMELINE_FREQS), index=1, horizontal=True, key="tl_freq")
+    with t2:
+        window = st.select_slider("Rolling window (buckets)", options=TIMELINE_WINDOWS, value=7, key="tl_window")
+    with t3:
+        videos = st.multiselect(
+            "Videos",
+            options=st.session_state.current_videos,
+            default=st.session_state.current_videos[:10],
+            format_func=lambda x: st.session_state.video_data.get(x, {}).get("title", x)[:50],
+            key="tl_videos",
+        )
 
-    mapping = {
-        "Newest": ("published_at", False),
-        "Oldest": ("published_at", True),
-        "Most Likes": ("like_count", False),
-        "Highest Sentiment": ("sentiment_score", False),
-        "Lowest Sentiment": ("sentiment_score", True),
-    }
-    col, asc = mapping[sort_by]
-    filtered = filtered.sort_values(col, ascending=asc)
+    freq = TIMELINE_FREQS[granularity]
+    buckets = {vid: video_timeline(vid, freq) for vid in videos}
+    buckets = {vid: b for vid, b in buckets.items() if b is not None and len(b)}
+    if not buckets:
+        st.info("No dated comments to chart.")
+        return
+
+    series = {}
+    for vid, b in buckets.items():
+        name = st.session_state.video_data.get(vid, {}).get("title", vid)
+        series[name if name not in series else f"{name} ({vid})"] = rolling_timeline(b, window)
+    combined = rolling_timeline(merge_timelines(freq, *buckets.values()), window)
+    if len(buckets) > 1:
+        series["All videos"] = combined
+
+    st.plotly_chart(timeline_chart(series, window, combined), use_container_width=True)
+
+    busiest = combined["Comments"].idxmax()
+    st.caption(
+        f"{len(combined):,} {granularity.lower()} buckets • busiest {busiest:%Y-%m-%d %H:%M} UTC "
+        f"with {int(combined['Comments'].max()):,} comments • sentiment lines are {window}-bucket rolling means"
+    )
 
-    show = filtered.head(n_show).copy()
-    show["published_at"] = show["published_at"].dt.strftime("%Y-%m-%d %H:%M")
+def render_collections(table):
+    st.markdown(
+        """
+        <div class="card">
+            <div style="font-size:16px; font-weight:800;">Channels and playlists</div>
+            <div class="subtitle">Totals over each channel's or playlist's selected videos.</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+    st.markdown("")
     st.dataframe(
-        show[["published_at", "author", "like_count", "sentiment", "sentiment_score", "comment"]],
+        table.style.format(
+            {
+                "Total Comments": "{:,.0f}",
+                "Positive %": "{:.1f}%",
+                "Neutral %": "{:.1f}%",
+                "Negative %": "{:.1f}%",
+                "Avg Sentiment": "{:.3f}",
+                "Like-weighted Sentiment": "{:.3f}",
+                "Comments per Video": "{:,.0f}",
+            }
+        ),
         use_container_width=True,
-        height=520,
+        hide_index=True,
     )
+    st.markdown("")
+
+def render_compare():
+    once = st.checkbox("Count each duplicate group once", key="cmp_once")
+    collections = build_collections(once)
+    if collections is not None:
+        render_collections(collections)
 
-with tabs[2]:
     if len(st.session_state.current_videos) < 2:
         st.info("Add at least 2 videos to compare.")
-        st.stop()
+        return
 
-    comp = build_comparison(st.session_state.current_videos)
+    comp = build_comparison(st.session_state.current_videos, once)
     if comp is None or comp.empty:
         st.info("No comparison data yet.")
-        st.stop()
+        return
 
     st.markdown(
         """
@@ -814,26 +1856,7 @@ with tabs[2]:
     )
     st.markdown("")
 
-    fig = px.bar(
-        comp,
-        x="Video",
-        y=["Positive %", "Neutral %", "Negative %"],
-        barmode="group",
-        title="Sentiment by video",
-        color_discrete_map={
-            "Positive %": SENTIMENT_COLORS["Positive"],
-            "Neutral %": SENTIMENT_COLORS["Neutral"],
-            "Negative %": SENTIMENT_COLORS["Negative"],
-        },
-    )
-    fig.update_layout(
-        paper_bgcolor="rgba(0,0,0,0)",
-        plot_bgcolor="rgba(0,0,0,0)",
-        font=dict(color=THEME["text"]),
-        title_font=dict(color=THEME["text"]),
-        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="left", x=0),
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(comparison_chart(comp), use_container_width=True)
 
     st.dataframe(
         comp.style.format(
@@ -843,50 +1866,149 @@ with tabs[2]:
                 "Neutral %": "{:.1f}%",
                 "Negative %": "{:.1f}%",
                 "Avg Sentiment": "{:.3f}",
+                "Like-weighted Sentiment": "{:.3f}",
             }
         ),
         use_container_width=True,
         height=320,
     )
 
-with tabs[3]:
+def deferred_downloads():
+    # Newer Streamlit accepts a callable for download_button data and only
+    # calls it when the button is clicked.
+    from streamlit.runtime.media_file_manager import MediaFileManager
+
+    return hasattr(MediaFileManager, "add_deferred")
+
+def export_payload(entry, key, build):
+    # Export bytes are built on first download and kept in the scored cache
+    # entry, so they go away with it when the video's data changes.
+    cache = entry.setdefault("exports", {})
+
+    def payload():
+        data = cache.get(key)
+        if data is None:
+            with metrics.timer("export"):
+                data = build()
+            cache[key] = data
+            while len(cache) > EXPORT_CACHE:
+                cache.pop(next(iter(cache)))
+        return data
+
+    return payload
+
+def export_button(label, entry, key, build, file_name, mime):
+    payload = export_payload(entry, key, build)
+    if deferred_downloads():
+        data = payload
+    elif key in entry.get("exports", {}) or st.button(f"Prepare {label}", key=f"prep_{'_'.join(map(str, key))}", use_container_width=True):
+        data = payload()
+    else:
+        return
+    st.download_button(f"Download {label}", data=data, file_name=file_name, mime=mime, use_container_width=True)
+
+def start_archive(fmt, once=False, include_replies=True):
+    # The worker gets the scored frames themselves (no copies) plus the
+    # comparison table; it never touches session state.
+    videos = []
+    for vid in st.session_state.current_videos:
+        entry = scored_entry(vid)
+        if entry is not None:
+            videos.append((vid, st.session_state.video_data[vid]["title"], entry["df"]))
+    old = st.session_state.get("archive_job")
+    if old is not None:
+        old.discard()
+    # Without replies the worker rebuilds the comparison from the filtered frames.
+    comparison = build_comparison(st.session_state.current_videos, once) if include_replies else None
+    job = exports.ArchiveJob(videos, comparison, fmt, once=once, include_replies=include_replies)
+    st.session_state.archive_job = job.start()
+
+def archive_status():
+    job = st.session_state.get("archive_job")
+    if job is None:
+        return
+    if not job.finished.is_set():
+        st.progress(job.done / max(job.total, 1), text=f"{job.done} of {job.total} videos • {job.status[:60]}")
+        return
+    if st.session_state.get("archive_polling"):
+        # Rerun the whole page once so the fragment stops polling.
+        st.session_state.archive_polling = False
+        st.rerun()
+    if job.error:
+        st.error(f"Export failed: {job.error}")
+        return
+
+    stale = job.video_ids != st.session_state.current_videos
+    st.caption(
+        f"{len(job.video_ids)} videos • {job.fmt} • {job.size() / 1e6:.1f} MB • built in {job.elapsed:.1f}s"
+        + (" • duplicates counted once" if job.once else "")
+        + ("" if job.include_replies else " • without replies")
+        + (" • videos changed since" if stale else "")
+    )
+    st.download_button(
+        "Download ZIP",
+        data=job.read if deferred_downloads() else job.read(),
+        file_name=f"youtube_export_{datetime.fromtimestamp(job.started).strftime('%Y%m%d_%H%M%S')}.zip",
+        mime="application/zip",
+        use_container_width=True,
+    )
+
+def render_archive(fmt, once=False, include_replies=True):
+    st.markdown(
+        """
+        <div class="card">
+            <div style="font-size:16px; font-weight:800;">Export all videos</div>
+            <div class="subtitle">One ZIP with a summary across videos, the comparison table and a detailed file per video.</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+    st.markdown("")
+
+    job = st.session_state.get("archive_job")
+    running = job is not None and not job.finished.is_set()
+    if st.button("Build ZIP of all videos", disabled=running, use_container_width=True):
+        start_archive(fmt, once, include_replies)
+        running = True
+
+    # While the worker runs only this fragment reruns, polling its progress.
+    st.session_state.archive_polling = running
+    st.fragment(archive_status, run_every=ARCHIVE_POLL_SECONDS if running else None)()
+
+def render_export():
     vid = st.selectbox(
         "Video",
         options=st.session_state.current_videos,
         format_func=lambda x: st.session_state.video_data.get(x, {}).get("title", x)[:70],
         key="xp_vid",
     )
-    data = st.session_state.video_data.get(vid)
+    data = viewed_video(vid)
     if not data:
         st.info("Video data missing. Re-add the video.")
-        st.stop()
+        return
 
-    df = analyze_sentiment(data["df"])
-    if df is None or df.empty:
+    entry = scored_entry(vid, data)
+    if entry is None:
         st.info("No comments to export.")
-        st.stop()
-
-    counts = df["sentiment"].value_counts()
-    summary = pd.DataFrame(
-        {
-            "Video Title": [data["title"]],
-            "Video ID": [vid],
-            "Total Comments": [len(df)],
-            "Avg Sentiment": [df["sentiment_score"].mean()],
-            "Positive %": [(df["sentiment"] == "Positive").mean() * 100],
-            "Neutral %": [(df["sentiment"] == "Neutral").mean() * 100],
-            "Negative %": [(df["sentiment"] == "Negative").mean() * 100],
-            "Positive Count": [int(counts.get("Positive", 0))],
-            "Neutral Count": [int(counts.get("Neutral", 0))],
-            "Negative Count": [int(counts.get("Negative", 0))],
-            "Generated At": [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-        }
-    )
+        return
+
+    include_replies = True
+    if explore_index(entry)["has_replies"]:
+        include_replies = st.checkbox("Include replies", value=True, key="xp_replies")
+    once = st.checkbox("Count each duplicate group once", key="xp_once")
+    fmt = st.radio("Format", exports.available_formats(), horizontal=True, key="xp_format")
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    title = data["title"]
+
+    def rows():
+        df = filter_replies(entry["df"], include_replies)
+        return collapse_duplicates(df) if once else df
+
+    def summary():
+        return exports.export_bytes([pd.DataFrame([summary_row(vid, title, rows())])], fmt)
 
-    detailed = df.copy()
-    detailed["video_id"] = vid
-    detailed["video_title"] = data["title"]
-    detailed["analysis_timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def detailed():
+        return exports.export_bytes(detailed_chunks(vid, title, rows(), chunk_rows=exports.CSV_CHUNK_ROWS), fmt)
 
     st.markdown(
         """
@@ -901,29 +2023,55 @@ with tabs[3]:
 
     e1, e2 = st.columns(2)
     with e1:
-        st.download_button(
-            "Download summary CSV",
-            data=summary.to_csv(index=False).encode("utf-8"),
-            file_name=f"youtube_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv",
-            use_container_width=True,
+        export_button(
+            f"summary {fmt}",
+            entry,
+            ("summary", fmt, include_replies, once),
+            summary,
+            exports.file_name("youtube_summary", fmt, stamp),
+            exports.mime_type(fmt),
         )
     with e2:
-        st.download_button(
-            "Download detailed CSV",
-            data=detailed.to_csv(index=False).encode("utf-8"),
-            file_name=f"youtube_detailed_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv",
-            use_container_width=True,
+        export_button(
+            f"detailed {fmt}",
+            entry,
+            ("detailed", fmt, include_replies, once),
+            detailed,
+            exports.file_name("youtube_detailed", fmt, stamp),
+            exports.mime_type(fmt),
         )
 
+    st.markdown("")
+    render_archive(fmt, once, include_replies)
+
+tabs = st.tabs(["Overview", "Explore", "Timeline", "Compare", "Export"])
+with tabs[0], metrics.timer("tab_overview"):
+    render_overview()
+with tabs[1], metrics.timer("tab_explore"):
+    render_explore()
+with tabs[2], metrics.timer("tab_timeline"):
+    render_timeline()
+with tabs[3], metrics.timer("tab_compare"):
+    render_compare()
+with tabs[4], metrics.timer("tab_export"):
+    render_export()
+
 st.markdown("")
 st.markdown(
     f"""
     <div class="card-soft" style="text-align:center;">
         <div style="font-weight:800;">{APP_NAME} v{APP_VERSION}</div>
         <div class="subtitle">Secure session • {datetime.now().strftime("%Y-%m-%d %H:%M")}</div>
+        <div class="subtitle">Sentiment cache • {st.session_state.scored_stats['hits']} hits • {st.session_state.scored_stats['misses']} misses</div>
+        <div class="subtitle">API quota • {quota.SCHEDULER.ledger.used():,} of {quota.SCHEDULER.ledger.budget:,} units used today • {quota.SCHEDULER.stats['retries']} retries</div>
+        <div class="subtitle">YouTube client • built {youtube_api.CLIENT_STATS['builds']}x in {youtube_api.CLIENT_STATS['build_ms']:.0f} ms • {youtube_api.CLIENT_STATS['lookups']} lookups</div>
     </div>
     """,
     unsafe_allow_html=True,
 )
+
+if st.session_state.is_admin:
+    render_diagnostics()
+
+release_memory()
+finish_rerun()
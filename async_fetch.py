@@ -0,0 +1,313 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+import zlib
+
+import comment_store
+import metrics
+import pipeline
+import quota
+from pipeline import FetchError, add_comment, extend_columns, new_comment_columns, parse_thread_page
+
+# Alternative fetch engine: the same Data API REST endpoints as the
+# googleapiclient path, called from asyncio over one pooled keep-alive
+# aiohttp session. Responses are requested gzip-compressed and trimmed with
+# a `fields` mask to the few fields the pipeline keeps, video metadata and
+# comment pages of many videos are in flight at once, and every response's
+# wire bytes, decoded bytes and time are recorded in PageStats so the two
+# paths can be compared (see benchmarks/run.py and cli.py --engine async).
+# Quota, rate limit and retries go through quota.SCHEDULER like the
+# blocking path. aiohttp is imported when an engine is opened.
+
+API_ROOT = os.environ.get("YOUTUBE_API_ROOT", "https://youtube.googleapis.com/")
+CONNECTIONS = int(os.environ.get("ASYNC_FETCH_CONNECTIONS", "16"))
+HTTP_TIMEOUT = 30
+
+# Google only serves gzip when the User-Agent also says "gzip".
+USER_AGENT = "youtube-sentiment-apps (gzip)"
+
+COMMENT_FIELDS = "id,snippet(textDisplay,publishedAt,likeCount,authorDisplayName)"
+THREAD_FIELDS = (
+    f"nextPageToken,items(id,snippet(totalReplyCount,topLevelComment({COMMENT_FIELDS})),replies(comments({COMMENT_FIELDS})))"
+)
+REPLY_FIELDS = f"nextPageToken,items({COMMENT_FIELDS})"
+VIDEO_FIELDS = "items(snippet(title),statistics)"
+
+
+class ApiError(Exception):
+    # str() carries the API reason (commentsDisabled, quotaExceeded, ...) so
+    # fetch_error_message and quota.is_retryable treat it like HttpError.
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        try:
+            error = json.loads(body)["error"]
+            reasons = ",".join(e.get("reason", "") for e in error.get("errors", []))
+            message = f"{error.get('message', '')} ({reasons})" if reasons else error.get("message", "")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            message = body[:200].decode("utf-8", "replace") if isinstance(body, bytes) else str(body)[:200]
+        super().__init__(f"HTTP {status_code}: {message}")
+
+
+class PageStats:
+    def __init__(self):
+        self.pages = []  # (endpoint, wire bytes, decoded bytes, seconds)
+
+    def record(self, endpoint, wire, decoded, seconds):
+        self.pages.append((endpoint, wire, decoded, seconds))
+        metrics.observe(f"async_{endpoint}", seconds)
+
+    def summary(self):
+        if not self.pages:
+            return {"requests": 0, "wire_bytes": 0, "decoded_bytes": 0, "bytes_per_page": 0, "mean_ms": 0.0, "p95_ms": 0.0}
+        wire = sum(p[1] for p in self.pages)
+        times = sorted(p[3] * 1000 for p in self.pages)
+        return {
+            "requests": len(self.pages),
+            "wire_bytes": wire,
+            "decoded_bytes": sum(p[2] for p in self.pages),
+            "bytes_per_page": wire / len(self.pages),
+            "mean_ms": sum(times) / len(times),
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))],
+        }
+
+
+def decode_body(raw, encoding):
+    if encoding == "gzip":
+        return gzip.decompress(raw)
+    if encoding == "deflate":
+        return zlib.decompress(raw)
+    return raw
+
+
+class AsyncYouTube:
+    def __init__(self, api_key, api_endpoint=None, connections=CONNECTIONS, scheduler=None, stats=None):
+        self.api_key = api_key
+        self.base = (api_endpoint or API_ROOT).rstrip("/") + "/youtube/v3/"
+        self.connections = connections
+        self.scheduler = scheduler or quota.SCHEDULER
+        self.stats = stats or PageStats()
+        self.session = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        # auto_decompress is off so the stats see the compressed size.
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60),
+            headers={"Accept-Encoding": "gzip", "User-Agent": USER_AGENT},
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            auto_decompress=False,
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def get(self, endpoint, **params):
+        import aiohttp
+
+        params = {k: v for k, v in params.items() if v is not None}
+        params["key"] = self.api_key
+        cost = quota.UNIT_COSTS.get(f"youtube.{endpoint}.list", quota.DEFAULT_COST)
+        attempt = 0
+        while True:
+            self.scheduler.admit(cost)
+            while True:
+                wait = self.scheduler.bucket.take()
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+            t0 = time.perf_counter()
+            try:
+                async with self.session.get(self.base + endpoint, params=params) as resp:
+                    raw = await resp.read()
+                    body = decode_body(raw, resp.headers.get("Content-Encoding", ""))
+                    self.stats.record(endpoint, len(raw), len(body), time.perf_counter() - t0)
+                    if resp.status != 200:
+                        raise ApiError(resp.status, body)
+                    return json.loads(body)
+            except (ApiError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = ConnectionError(str(e)) if isinstance(e, aiohttp.ClientConnectionError) else e
+                if not self.scheduler.should_retry(error, attempt):
+                    raise error from e
+            await asyncio.sleep(quota.backoff_delay(attempt))
+            attempt += 1
+
+    async def video_info(self, video_id):
+        vr = await self.get("videos", part="snippet,statistics", id=video_id, fields=VIDEO_FIELDS)
+        if not vr.get("items"):
+            raise FetchError("Video not found or not accessible.")
+        info = vr["items"][0]
+        return info.get("snippet", {}).get("title", "Unknown Title"), info.get("statistics", {})
+
+    async def thread_replies(self, thread_id, max_replies=pipeline.MAX_REPLIES_PER_THREAD):
+        replies = new_comment_columns()
+        token = None
+        while len(replies["comment_id"]) < max_replies:
+            response = await self.get(
+                "comments",
+                part="snippet",
+                parentId=thread_id,
+                maxResults=100,
+                pageToken=token,
+                textFormat="plainText",
+                fields=REPLY_FIELDS,
+            )
+            for item in response.get("items", []):
+                add_comment(replies, item["snippet"], item.get("id"), parent_id=thread_id, depth=1)
+            token = response.get("nextPageToken")
+            if not token:
+                break
+        return replies
+
+    async def comment_pages(self, video_id, max_comments=500, since=None, known=None, replies=False):
+        # Async twin of pipeline.iter_comment_pages.
+        fetched, token = 0, None
+        known = known or set()
+        seen_threads = set()
+        while fetched < max_comments:
+            response = await self.get(
+                "commentThreads",
+                part="snippet,replies" if replies else "snippet",
+                videoId=video_id,
+                maxResults=100,
+                pageToken=token,
+                textFormat="plainText",
+                order="time",
+                fields=THREAD_FIELDS,
+            )
+            page, partial, reached_known = parse_thread_page(response, known, since, replies)
+            todo = [t for t in partial if t not in seen_threads]
+            seen_threads.update(todo)
+            results = await asyncio.gather(*(self.thread_replies(t) for t in todo), return_exceptions=True)
+            for thread_id, result in zip(todo, results):
+                extend_columns(page, partial[thread_id] if isinstance(result, BaseException) else result)
+
+            fetched += len(page["comment_id"])
+            yield page
+
+            token = response.get("nextPageToken")
+            if reached_known or not token:
+                return
+
+    async def comments(self, video_id, max_comments=500, since=None, known=None, on_page=None, replies=False):
+        out = new_comment_columns()
+        try:
+            async for page in self.comment_pages(video_id, max_comments, since, known, replies):
+                extend_columns(out, page)
+                if on_page is not None:
+                    on_page(len(out["comment_id"]))
+        except ApiError as e:
+            if "commentsDisabled" in str(e):
+                return new_comment_columns()
+            raise
+        return out
+
+    async def download_video(
+        self, video_id, video_url, stored=None, on_page=None, max_comments=pipeline.MAX_COMMENTS, replies=False, info=None
+    ):
+        # Same result as pipeline.download_video, but the metadata call runs
+        # alongside the first comment pages instead of before them.
+        fresh, replies = pipeline.fetch_mode(stored, max_comments, replies)
+        if info is None:
+            info = asyncio.ensure_future(self.video_info(video_id))
+        else:
+            # Details already fetched in a batch (pipeline.video_details).
+            details, info = info, asyncio.get_running_loop().create_future()
+            info.set_result((details["title"], details["stats"]))
+        pages = asyncio.ensure_future(
+            self.comments(
+                video_id,
+                max_comments=max_comments,
+                since=None if fresh else stored["watermark"],
+                known=None if fresh else set(stored["df"]["comment_id"]),
+                on_page=on_page,
+                replies=replies,
+            )
+        )
+        try:
+            title, stats = await info
+        except BaseException:
+            pages.cancel()
+            raise
+        comments = await pages
+        if fresh and not comments["comment_id"]:
+            raise FetchError("No comments returned. Comments may be disabled for this video.")
+        depth = pipeline.fetch_depth(comments, max_comments, fresh)
+
+        def save():
+            try:
+                comment_store.save_video(
+                    video_id, title, video_url, stats, comments, fetch_limit=depth, fetch_replies=replies
+                )
+                return comment_store.load_video(video_id)
+            except Exception:
+                return None
+
+        stored = await asyncio.to_thread(save)
+        if stored is not None:
+            return pipeline.stored_payload(stored, video_url)
+        return pipeline.video_payload(
+            pipeline.comments_frame(comments), title, video_url, stats, fetch_limit=depth, fetch_replies=replies
+        )
+
+    async def fetch_video(self, video_id, video_url, **kwargs):
+        stored = await asyncio.to_thread(pipeline.load_stored, video_id)
+        max_comments = kwargs.get("max_comments", pipeline.MAX_COMMENTS)
+        replies = kwargs.get("replies", False)
+        if stored is not None and not stored["df"].empty and pipeline.covers(stored, max_comments, replies):
+            return pipeline.stored_payload(stored, video_url)
+        return await self.download_video(video_id, video_url, stored, **kwargs)
+
+    async def fetch_many(self, items, workers=pipeline.BULK_FETCH_WORKERS, infos=None, **kwargs):
+        # Yields (video_id, payload, error_message) as videos finish, with at
+        # most `workers` videos in flight.
+        gate = asyncio.Semaphore(max(1, workers))
+        infos = infos or {}
+
+        async def one(vid, url):
+            async with gate:
+                try:
+                    return vid, await self.fetch_video(vid, url, info=infos.get(vid), **kwargs), None
+                except Exception as e:
+                    return vid, None, pipeline.fetch_error_message(e)
+
+        for done in asyncio.as_completed([one(vid, url) for vid, url in items]):
+            yield await done
+
+
+def fetch_many(
+    api_key,
+    items,
+    max_comments=pipeline.MAX_COMMENTS,
+    replies=False,
+    workers=pipeline.BULK_FETCH_WORKERS,
+    api_endpoint=None,
+    stats=None,
+    infos=None,
+):
+    # Blocking generator with the same (video_id, payload, error) results as
+    # pipeline.fetch_many, for callers without an event loop. The loop only
+    # runs while the caller waits for the next result.
+    loop = asyncio.new_event_loop()
+
+    async def start():
+        engine = AsyncYouTube(api_key, api_endpoint=api_endpoint, stats=stats)
+        await engine.__aenter__()
+        return engine
+
+    engine = loop.run_until_complete(start())
+    results = engine.fetch_many(items, workers=workers, infos=infos, max_comments=max_comments, replies=replies)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(results.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(results.aclose())
+        loop.run_until_complete(engine.__aexit__(None, None, None))
+        loop.close()
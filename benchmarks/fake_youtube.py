@@ -0,0 +1,307 @@
+import gzip
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the commentThreads.list, videos.list, channels.list,
+# playlists.list and playlistItems.list endpoints of the YouTube Data API v3.
+# Every channel handle or ID resolves to one channel whose uploads playlist
+# holds `uploads` videos, one per day back from BASE_TIME; every tenth has
+# comments disabled. Other playlist IDs list the same videos oldest first.
+# Comments are generated deterministically from the
+# video ID and position, so any page can be served without holding the whole
+# video in memory. Resources carry the same fields as real responses, the
+# `fields` partial-response mask is honoured and bodies are gzipped when the
+# client accepts it, so payload sizes are comparable to the real API. Point
+# a client at it with youtube_api.build_service(key, api_endpoint=server.url)
+# or async_fetch.AsyncYouTube(key, api_endpoint=server.url).
+
+WORDS = (
+    "great love amazing awesome best good nice happy beautiful perfect helpful "
+    "bad terrible worst awful boring sad hate wrong poor ugly annoying "
+    "video song part time really very not so quite pretty too never ever "
+    "the this that it was is and but i you we they my your thanks lol wow"
+).split()
+PUNCTUATION = ["", "", "", "!", "!!", "?", ".", " :)", " :("]
+BASE_TIME = datetime(2024, 6, 1, tzinfo=timezone.utc)
+CHANNEL_ID = "UCbenchmarkchannel000000"
+
+
+def parse_fields(mask):
+    # "a,b(c,d/e)" -> {"a": None, "b": {"c": None, "d": {"e": None}}}
+    def parse(i):
+        spec, name = {}, ""
+        while i < len(mask):
+            ch = mask[i]
+            if ch == "(":
+                sub, i = parse(i + 1)
+                add(spec, name, sub)
+                name = ""
+            elif ch == ")":
+                break
+            elif ch == ",":
+                add(spec, name, None)
+                name = ""
+            else:
+                name += ch
+            i += 1
+        add(spec, name, None)
+        return spec, i
+
+    def add(spec, path, sub):
+        path = path.strip()
+        if not path:
+            return
+        *parents, leaf = path.split("/")
+        for p in parents:
+            spec = spec.setdefault(p, {})
+        if sub is None and leaf in spec:
+            return
+        spec[leaf] = sub
+
+    return parse(0)[0]
+
+
+def apply_fields(obj, spec):
+    if spec is None:
+        return obj
+    if isinstance(obj, list):
+        return [apply_fields(x, spec) for x in obj]
+    if not isinstance(obj, dict):
+        return obj
+    return {k: apply_fields(obj[k], sub) for k, sub in spec.items() if k in obj}
+
+
+class FakeYouTube:
+    def __init__(self, comments=500, latency_ms=0.0, error_rate=0.0, seed=0, page_size=100, uploads=0):
+        self.comments = comments
+        self.uploads = uploads
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.page_size = page_size
+        self.stats = {"requests": 0, "errors": 0, "bytes": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def comment(self, video_id, i):
+        rng = random.Random(zlib.crc32(f"{video_id}:{i}".encode()))
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))) + rng.choice(PUNCTUATION)
+        published = (BASE_TIME - timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        author = rng.randint(0, 999)
+        channel = f"UC{zlib.crc32(str(author).encode()):022d}"
+        return {
+            "kind": "youtube#commentThread",
+            "etag": f"etag-{video_id}-t{i}",
+            "id": f"{video_id}.t{i}",
+            "snippet": {
+                "channelId": "UCbenchmarkchannel000000",
+                "videoId": video_id,
+                "topLevelComment": {
+                    "kind": "youtube#comment",
+                    "etag": f"etag-{video_id}-c{i}",
+                    "id": f"{video_id}.c{i}",
+                    "snippet": {
+                        "channelId": "UCbenchmarkchannel000000",
+                        "videoId": video_id,
+                        "textDisplay": text,
+                        "textOriginal": text,
+                        "authorDisplayName": f"user{author}",
+                        "authorProfileImageUrl": f"https://yt3.ggpht.com/ytc/{channel}=s48-c-k-c0x00ffffff-no-rj",
+                        "authorChannelUrl": f"http://www.youtube.com/channel/{channel}",
+                        "authorChannelId": {"value": channel},
+                        "canRate": True,
+                        "viewerRating": "none",
+                        "likeCount": rng.randint(0, 50),
+                        "publishedAt": published,
+                        "updatedAt": published,
+                    },
+                },
+                "canReply": True,
+                "totalReplyCount": 0,
+                "isPublic": True,
+            },
+        }
+
+    def comment_threads(self, params):
+        video_id = params.get("videoId", "")
+        start = int(params.get("pageToken") or 0)
+        size = min(int(params.get("maxResults") or 20), self.page_size)
+        end = min(start + size, self.comments)
+        out = {
+            "kind": "youtube#commentThreadListResponse",
+            "etag": f"etag-{video_id}-{start}",
+            "pageInfo": {"totalResults": end - start, "resultsPerPage": size},
+            "items": [self.comment(video_id, i) for i in range(start, end)],
+        }
+        if end < self.comments:
+            out["nextPageToken"] = str(end)
+        return out
+
+    def upload_id(self, i):
+        return f"bv{i:09d}"
+
+    def upload_published(self, video_id):
+        if video_id.startswith("bv") and video_id[2:].isdigit():
+            return BASE_TIME - timedelta(days=int(video_id[2:]))
+        return BASE_TIME
+
+    def videos(self, params):
+        items = []
+        for video_id in params.get("id", "").split(","):
+            stats = {"viewCount": "1000", "likeCount": "50", "favoriteCount": "0"}
+            if not (video_id.startswith("bv") and int(video_id[2:] or 0) % 10 == 9):
+                stats["commentCount"] = str(self.comments)
+            items.append(
+                {
+                    "kind": "youtube#video",
+                    "id": video_id,
+                    "snippet": {
+                        "publishedAt": self.upload_published(video_id).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        "channelId": CHANNEL_ID,
+                        "title": f"Benchmark video {video_id}",
+                        "channelTitle": "Benchmark channel",
+                    },
+                    "statistics": stats,
+                    "status": {"privacyStatus": "public"},
+                }
+            )
+        return {"kind": "youtube#videoListResponse", "items": items}
+
+    def channels(self, params):
+        return {
+            "kind": "youtube#channelListResponse",
+            "items": [
+                {
+                    "kind": "youtube#channel",
+                    "id": CHANNEL_ID,
+                    "snippet": {"title": "Benchmark channel", "customUrl": "@benchmark"},
+                    "contentDetails": {"relatedPlaylists": {"likes": "", "uploads": "UU" + CHANNEL_ID[2:]}},
+                }
+            ],
+        }
+
+    def playlists(self, params):
+        playlist_id = params.get("id", "")
+        return {
+            "kind": "youtube#playlistListResponse",
+            "items": [
+                {
+                    "kind": "youtube#playlist",
+                    "id": playlist_id,
+                    "snippet": {"title": f"Playlist {playlist_id}", "channelTitle": "Benchmark channel"},
+                    "contentDetails": {"itemCount": self.uploads},
+                }
+            ],
+        }
+
+    def playlist_items(self, params):
+        playlist_id = params.get("playlistId", "")
+        start = int(params.get("pageToken") or 0)
+        size = min(int(params.get("maxResults") or 5), 50)
+        end = min(start + size, self.uploads)
+        order = range(start, end) if playlist_id.startswith("UU") else range(self.uploads - 1 - start, self.uploads - 1 - end, -1)
+        items = []
+        for i in order:
+            video_id = self.upload_id(i)
+            items.append(
+                {
+                    "kind": "youtube#playlistItem",
+                    "id": f"{playlist_id}.{i}",
+                    "contentDetails": {
+                        "videoId": video_id,
+                        "videoPublishedAt": self.upload_published(video_id).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    },
+                }
+            )
+        out = {"kind": "youtube#playlistItemListResponse", "pageInfo": {"totalResults": self.uploads}, "items": items}
+        if end < self.uploads:
+            out["nextPageToken"] = str(end)
+        return out
+
+    def respond(self, path, params):
+        # Returns (status, body dict) for one request.
+        with self._lock:
+            self.stats["requests"] += 1
+            fail = self.error_rate and self._rng.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if fail:
+            return 503, {"error": {"code": 503, "message": "Backend Error", "errors": [{"reason": "backendError"}]}}
+
+        endpoint = path.rstrip("/").rsplit("/", 1)[-1]
+        if endpoint == "commentThreads":
+            body = self.comment_threads(params)
+        elif endpoint == "videos":
+            body = self.videos(params)
+        elif endpoint == "channels":
+            body = self.channels(params)
+        elif endpoint == "playlists":
+            body = self.playlists(params)
+        elif endpoint == "playlistItems":
+            body = self.playlist_items(params)
+        else:
+            return 404, {"error": {"code": 404, "message": f"Unknown endpoint {path}"}}
+        if params.get("fields"):
+            body = apply_fields(body, parse_fields(params["fields"]))
+        return 200, body
+
+    def serve(self, host="127.0.0.1", port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this,
+            # Nagle plus delayed ACKs add ~40 ms to every response.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                status, body = fake.respond(url.path, params)
+                data = json.dumps(body, indent=2).encode("utf-8")
+                gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+                if gzipped:
+                    data = gzip.compress(data, compresslevel=6, mtime=0)
+                with fake._lock:
+                    fake.stats["bytes"] += len(data)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                if gzipped:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.serve()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,277 @@
+import argparse
+import atexit
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Benchmarks for fetching, scoring and end-to-end video loads against the
+# local fake API, plus a comparison of the threaded googleapiclient fetch
+# path with the asyncio engine (async_fetch) on a multi-video batch. Writes
+# one JSON document per run so results from two versions can be diffed
+# (--baseline prints the ratios).
+#
+#   python benchmarks/run.py --sizes 500,10000,100000 --output bench.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The benchmark must not be throttled or charged against the real daily
+# budget, and must not write into the real comment store: configure that
+# before the app modules read their settings at import time.
+# The scratch store reaches hundreds of MB at 100k comments; it is removed
+# when the process exits, however the run ends.
+_SCRATCH = tempfile.mkdtemp(prefix="yt_bench_")
+atexit.register(shutil.rmtree, _SCRATCH, ignore_errors=True)
+os.environ["COMMENT_STORE_DIR"] = os.path.join(_SCRATCH, "store")
+os.environ["YOUTUBE_QUOTA_FILE"] = os.path.join(_SCRATCH, "quota.json")
+os.environ.setdefault("YOUTUBE_DAILY_QUOTA", str(10 ** 9))
+os.environ.setdefault("YOUTUBE_REQUESTS_PER_SECOND", "0")
+
+import pandas as pd  # noqa: E402
+
+import async_fetch  # noqa: E402
+import pipeline  # noqa: E402
+import quota  # noqa: E402
+import youtube_api  # noqa: E402
+from benchmarks.fake_youtube import FakeYouTube  # noqa: E402
+
+DEFAULT_SIZES = "500,10000,100000"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fetch and scoring against a fake YouTube API.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated comment counts per video")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per measurement (best is reported)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake API latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scoring-workers", type=int, default=pipeline.SCORING_WORKERS)
+    parser.add_argument("--engine-videos", type=int, default=8, help="videos in the fetch engine comparison (0 skips it)")
+    parser.add_argument("--engine-comments", type=int, default=2000, help="comments per video in the engine comparison")
+    parser.add_argument("--engine-workers", type=int, default=pipeline.BULK_FETCH_WORKERS, help="videos in flight per engine")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results path")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def timed(fn, repeat):
+    times, result = [], None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(i)
+        times.append(time.perf_counter() - t0)
+    return result, {"best_s": min(times), "median_s": statistics.median(times), "runs_s": times}
+
+
+def bench_size(yt, fake, n, args):
+    pages = math.ceil(n / fake.page_size)
+    out = {"comments": n, "pages": pages}
+
+    before = dict(quota.SCHEDULER.stats)
+    columns, t = timed(lambda i: pipeline.get_video_comments(yt, f"fetch{n}x{i}", max_comments=n), args.repeat)
+    got = len(columns["comment_id"])
+    out["get_video_comments"] = {
+        **t,
+        "comments_returned": got,
+        "pages_per_sec": pages / t["best_s"],
+        "comments_per_sec": got / t["best_s"],
+        "retries": quota.SCHEDULER.stats["retries"] - before["retries"],
+    }
+
+    df = pipeline.comments_frame(columns)
+    scored, t = timed(lambda i: pipeline.analyze_sentiment(df, workers=args.scoring_workers), args.repeat)
+    out["analyze_sentiment"] = {
+        **t,
+        "cold_s": t["runs_s"][0],
+        "comments_per_sec": len(df) / t["best_s"],
+        "label_counts": scored["sentiment"].value_counts().to_dict(),
+    }
+
+    # End to end as the dashboard does it: videos.list, paging, store write
+    # and reload, then scoring. Each run uses a new video so nothing is cached
+    # in the comment store.
+    def fetch_video(i):
+        vid = f"video{n}x{i}"
+        payload = pipeline.download_video(yt, vid, f"https://www.youtube.com/watch?v={vid}", max_comments=n)
+        return pipeline.analyze_sentiment(payload["df"], workers=args.scoring_workers)
+
+    _, t = timed(fetch_video, args.repeat)
+    out["fetch_video"] = t
+
+    tracemalloc.start()
+    fetch_video("mem")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    out["peak_memory_mb"] = peak / 1e6
+    return out
+
+
+def page_times(times):
+    times = sorted(t * 1000 for t in times)
+    if not times:
+        return 0.0, 0.0
+    return sum(times) / len(times), times[min(len(times) - 1, int(len(times) * 0.95))]
+
+
+def bench_engines(yt, fake, args):
+    # The same batch through both engines; bytes are counted by the fake
+    # server as sent on the wire, so both sides are measured the same way.
+    fake.comments = args.engine_comments
+    out = {"videos": args.engine_videos, "comments_per_video": args.engine_comments, "workers": args.engine_workers}
+
+    # Time each HTTP request of the threaded path at its pooled transport.
+    http, times = yt._http, []
+    request = http.request
+
+    def timed_request(*a, **k):
+        t0 = time.perf_counter()
+        try:
+            return request(*a, **k)
+        finally:
+            times.append(time.perf_counter() - t0)
+
+    def run(name, fetch):
+        items = [(f"{name}{i}", f"https://www.youtube.com/watch?v={name}{i}") for i in range(args.engine_videos)]
+        before = dict(fake.stats)
+        t0 = time.perf_counter()
+        got = sum(len(p["df"]) for _, p, err in fetch(items) if err is None)
+        wall = time.perf_counter() - t0
+        requests = fake.stats["requests"] - before["requests"]
+        wire = fake.stats["bytes"] - before["bytes"]
+        return {"wall_s": wall, "comments": got, "requests": requests, "wire_bytes": wire, "bytes_per_request": wire / max(requests, 1)}
+
+    http.request = timed_request
+    try:
+        out["threads"] = run("thr", lambda items: pipeline.fetch_many(yt, items, args.engine_comments, workers=args.engine_workers))
+    finally:
+        http.request = request
+    out["threads"]["mean_ms"], out["threads"]["p95_ms"] = page_times(times)
+
+    stats = async_fetch.PageStats()
+    out["async"] = run(
+        "aio",
+        lambda items: async_fetch.fetch_many(
+            "benchmark", items, args.engine_comments, workers=args.engine_workers, api_endpoint=fake.url, stats=stats
+        ),
+    )
+    summary = stats.summary()
+    out["async"].update(mean_ms=summary["mean_ms"], p95_ms=summary["p95_ms"], decoded_bytes=summary["decoded_bytes"])
+    return out
+
+
+def compare(results, baseline):
+    old = {r["comments"]: r for r in baseline.get("results", [])}
+    rows = []
+    for r in results["results"]:
+        b = old.get(r["comments"])
+        if b is None:
+            continue
+        rows.append(
+            {
+                "comments": r["comments"],
+                "pages/s": r["get_video_comments"]["pages_per_sec"] / b["get_video_comments"]["pages_per_sec"],
+                "scored/s": r["analyze_sentiment"]["comments_per_sec"] / b["analyze_sentiment"]["comments_per_sec"],
+                "fetch_video": r["fetch_video"]["best_s"] / b["fetch_video"]["best_s"],
+                "peak MB": r["peak_memory_mb"] / b["peak_memory_mb"],
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    fake = FakeYouTube(latency_ms=args.latency_ms, error_rate=args.error_rate, seed=args.seed)
+    with fake:
+        yt = youtube_api.build_service("benchmark", api_endpoint=fake.url)
+        results = []
+        for n in sizes:
+            fake.comments = n
+            print(f"Benchmarking {n:,} comments...", file=sys.stderr)
+            results.append(bench_size(yt, fake, n, args))
+        engines = None
+        if args.engine_videos > 0:
+            print(f"Comparing fetch engines on {args.engine_videos} videos...", file=sys.stderr)
+            engines = bench_engines(yt, fake, args)
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "config": {
+            "sizes": sizes,
+            "repeat": args.repeat,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+            "scoring_workers": args.scoring_workers,
+            "engine_videos": args.engine_videos,
+            "engine_comments": args.engine_comments,
+            "engine_workers": args.engine_workers,
+        },
+        "fake_api": dict(fake.stats),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "results": results,
+        "engines": engines,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    table = pd.DataFrame(
+        [
+            {
+                "comments": r["comments"],
+                "pages/s": r["get_video_comments"]["pages_per_sec"],
+                "scored/s": r["analyze_sentiment"]["comments_per_sec"],
+                "fetch_video s": r["fetch_video"]["best_s"],
+                "peak MB": r["peak_memory_mb"],
+            }
+            for r in results
+        ]
+    )
+    print(table.to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+    if engines:
+        print(f"\nFetch engines • {engines['videos']} videos x {engines['comments_per_video']:,} comments")
+        rows = [
+            {
+                "engine": name,
+                "wall s": engines[name]["wall_s"],
+                "requests": engines[name]["requests"],
+                "KB/request": engines[name]["bytes_per_request"] / 1e3,
+                "ms/request": engines[name]["mean_ms"],
+                "p95 ms": engines[name]["p95_ms"],
+            }
+            for name in ("threads", "async")
+        ]
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print("\nRatio to baseline (pages/s and scored/s: higher is better; seconds and MB: lower is better)")
+            print(compare(report, json.load(f)).to_string(index=False, float_format=lambda x: f"{x:.2f}x"))
+    print(f"\nWrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
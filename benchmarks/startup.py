@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Startup profile: runs the app to the login screen in a fresh interpreter
+# under `python -X importtime` and records the time to first paint plus the
+# import time of every module the script pulled in (streamlit itself is
+# imported before the measurement starts). Modules that should stay lazy
+# until after sign-in are flagged if the login screen loaded them.
+#
+#   python benchmarks/startup.py --repeat 5 --output startup.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "--- startup profile begins ---"
+# numpy is left out: Streamlit's own page setup imports it.
+HEAVY_MODULES = ["pandas", "textblob", "googleapiclient", "httplib2", "plotly.express", "pipeline"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile app imports up to the login screen.")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to run (median is reported)")
+    parser.add_argument("--top", type=int, default=25, help="modules listed in the printed table")
+    parser.add_argument("--output", default="startup_profile.json", help="JSON results path")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def child():
+    from streamlit.testing.v1 import AppTest
+
+    print(MARKER, file=sys.stderr, flush=True)
+    t0 = time.perf_counter()
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.run()
+    elapsed = time.perf_counter() - t0
+    labels = [t.label for t in at.text_input]
+    print(json.dumps({"first_paint_s": elapsed, "login_rendered": "Password" in labels, "modules": sorted(sys.modules)}))
+
+
+def parse_importtime(stderr):
+    rows = []
+    for line in stderr.split(MARKER, 1)[-1].splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        head, cumulative_us, name = line.split("|")
+        self_us = head.split(":")[1]
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append({"module": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": depth})
+    return rows
+
+
+def run_once():
+    env = dict(os.environ, PYTHONWARNINGS="ignore")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        child()
+        return
+
+    runs = [run_once() for _ in range(max(1, args.repeat))]
+    last = runs[-1]
+    modules = set(last.pop("modules"))
+    top_level = sorted((r for r in last["imports"] if r["depth"] == 0), key=lambda r: -r["cumulative_us"])
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "first_paint_s": statistics.median(r["first_paint_s"] for r in runs),
+        "first_paint_runs_s": [r["first_paint_s"] for r in runs],
+        "login_rendered": all(r["login_rendered"] for r in runs),
+        "import_total_s": sum(r["self_us"] for r in last["imports"]) / 1e6,
+        "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in modules],
+        "top_level_imports": top_level,
+        "imports": last["imports"],
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Login screen first paint: {report['first_paint_s'] * 1000:.0f} ms (median of {len(runs)})")
+    print(f"Imports during the run: {report['import_total_s'] * 1000:.0f} ms")
+    print(f"Heavy modules loaded before sign-in: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+    for r in top_level[: args.top]:
+        print(f"  {r['cumulative_us'] / 1000:8.1f} ms  {r['module']}")
+    print(f"\nWrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+import exports
+import metrics
+import pipeline
+import quota
+import youtube_api
+
+# Batch entry point: fetch and score a list of videos without Streamlit and
+# write the same summary and detailed CSVs as the dashboard's Export tab.
+#
+#   python cli.py videos.txt --workers 8 --max-comments 2000
+#
+# The input file holds video IDs or URLs, one per line or comma separated
+# ("-" reads stdin). Channel and playlist links expand to their videos from
+# the last --days days, and their totals go to a channel summary CSV.
+# The API key comes from --api-key or YOUTUBE_API_KEY.
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch and score YouTube comments in batch.")
+    parser.add_argument("input", help="file of video, channel or playlist IDs or URLs, or - for stdin")
+    parser.add_argument("--api-key", default=os.environ.get("YOUTUBE_API_KEY"), help="YouTube Data API key")
+    parser.add_argument("--workers", type=int, default=pipeline.BULK_FETCH_WORKERS, help="videos fetched concurrently")
+    parser.add_argument("--scoring-workers", type=int, default=pipeline.SCORING_WORKERS, help="sentiment scoring processes")
+    parser.add_argument("--max-comments", type=int, default=pipeline.MAX_COMMENTS, help="comments per video")
+    parser.add_argument("--replies", action="store_true", help="include reply threads")
+    parser.add_argument(
+        "--collapse-duplicates",
+        action="store_true",
+        help="count each group of duplicate or near-duplicate comments once",
+    )
+    parser.add_argument("--days", type=int, default=pipeline.CHANNEL_DAYS, help="channel/playlist videos published in the last N days (0 = all)")
+    parser.add_argument("--max-videos", type=int, default=pipeline.CHANNEL_MAX_VIDEOS, help="videos per channel or playlist")
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="fetch with googleapiclient on a thread pool, or with the asyncio engine (needs aiohttp)",
+    )
+    parser.add_argument("--summary", help="summary CSV path (default youtube_summary_<timestamp>.csv)")
+    parser.add_argument("--detailed", help="detailed CSV path (default youtube_detailed_<timestamp>.csv)")
+    parser.add_argument("--summary-only", action="store_true", help="skip the detailed CSV")
+    parser.add_argument("--channel-summary", help="channel/playlist totals CSV path (default youtube_channels_<timestamp>.csv)")
+    parser.add_argument("--metrics", help="write stage timings in Prometheus text format to this file")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    return parser.parse_args(argv)
+
+
+def read_items(path):
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    return pipeline.parse_inputs(text)
+
+
+def expand_sources(yt, sources, args, items, infos):
+    # Appends each channel's or playlist's videos to items; returns
+    # {source title: [video IDs]}.
+    since = pipeline.published_since(args.days)
+    seen = {vid for vid, _ in items}
+    out = {}
+    for source in sources:
+        try:
+            quota.SCHEDULER.check(pipeline.source_units(args.max_videos))
+            resolved = pipeline.resolve_source(yt, source)
+
+            def on_batch(listed, kept):
+                if not args.quiet:
+                    print(f"{resolved['title']} • listed {listed:,} videos, {kept:,} with comments", file=sys.stderr)
+
+            found = pipeline.source_videos(yt, resolved, since=since, limit=args.max_videos, on_batch=on_batch)
+        except Exception as e:
+            print(f"{source[1]}: {pipeline.fetch_error_message(e)}", file=sys.stderr)
+            continue
+        out[resolved["title"]] = list(found)
+        infos.update(found)
+        for vid in found:
+            if vid not in seen:
+                seen.add(vid)
+                items.append((vid, f"https://www.youtube.com/watch?v={vid}"))
+    return out
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.api_key:
+        print("Missing YouTube API key. Pass --api-key or set YOUTUBE_API_KEY.", file=sys.stderr)
+        return 2
+
+    items, sources, invalid = read_items(args.input)
+    for token in invalid:
+        print(f"Skipped, not a YouTube video link: {token[:80]}", file=sys.stderr)
+    infos, collections = {}, {}
+    if sources:
+        collections = expand_sources(youtube_api.build_service(args.api_key), sources, args, items, infos)
+    if not items:
+        print("No videos to process.", file=sys.stderr)
+        return 2
+
+    try:
+        quota.SCHEDULER.check(pipeline.units_needed(items, args.max_comments, infos, replies=args.replies))
+    except quota.QuotaError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    summary_path = args.summary or f"youtube_summary_{stamp}.csv"
+    detailed_path = None if args.summary_only else args.detailed or f"youtube_detailed_{stamp}.csv"
+    channel_path = (args.channel_summary or f"youtube_channels_{stamp}.csv") if collections else None
+
+    rows, failed = [], 0
+    aggs = {}
+    page_stats = None
+    if args.engine == "async":
+        import async_fetch
+
+        page_stats = async_fetch.PageStats()
+        results = async_fetch.fetch_many(
+            args.api_key,
+            items,
+            max_comments=args.max_comments,
+            replies=args.replies,
+            workers=args.workers,
+            stats=page_stats,
+            infos=infos,
+        )
+    else:
+        results = pipeline.fetch_many(
+            youtube_api.build_service(args.api_key),
+            items,
+            max_comments=args.max_comments,
+            replies=args.replies,
+            workers=args.workers,
+            infos=infos,
+        )
+    for vid, payload, error in results:
+        if error is not None:
+            failed += 1
+            print(f"{vid}: {error}", file=sys.stderr)
+            continue
+
+        df = pipeline.analyze_sentiment(payload["df"], workers=args.scoring_workers)
+        if df is None or df.empty:
+            failed += 1
+            print(f"{vid}: No comments returned.", file=sys.stderr)
+            continue
+        if args.collapse_duplicates:
+            df = pipeline.collapse_duplicates(df)
+
+        generated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows.append(pipeline.summary_row(vid, payload["title"], df, generated_at))
+        if collections:
+            aggs[vid] = (payload["title"], pipeline.sentiment_aggregate(df))
+        if detailed_path:
+            # Appended per video so thousands of videos never sit in memory at once.
+            with open(detailed_path, "wb" if len(rows) == 1 else "ab") as fh:
+                exports.write_csv(
+                    pipeline.detailed_chunks(vid, payload["title"], df, generated_at, exports.CSV_CHUNK_ROWS),
+                    fh,
+                    header=len(rows) == 1,
+                )
+        if not args.quiet:
+            print(f"[{len(rows) + failed}/{len(items)}] {vid} • {len(df):,} comments", file=sys.stderr)
+
+    pd.DataFrame(rows).to_csv(summary_path, index=False)
+    if channel_path:
+        pd.DataFrame(
+            [
+                pipeline.collection_row(title, {vid: aggs[vid] for vid in vids if vid in aggs})
+                for title, vids in collections.items()
+            ]
+        ).to_csv(channel_path, index=False)
+    if args.metrics:
+        metrics.write_prometheus(args.metrics, force=True)
+    if not args.quiet:
+        written = [p for p in (summary_path, detailed_path if rows else None, channel_path) if p]
+        print(f"Wrote {', '.join(written)}", file=sys.stderr)
+        if page_stats is not None and page_stats.pages:
+            p = page_stats.summary()
+            print(
+                f"{p['requests']:,} requests • {p['wire_bytes'] / 1e6:,.2f} MB on the wire "
+                f"({p['decoded_bytes'] / 1e6:,.2f} MB decoded) • {p['mean_ms']:.0f} ms mean, {p['p95_ms']:.0f} ms p95 per request",
+                file=sys.stderr,
+            )
+        print(
+            f"{len(rows)} of {len(items)} videos • {quota.SCHEDULER.stats['units']:,} API units used",
+            file=sys.stderr,
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+import json
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+# Local SQLite store of fetched comments, one file per deployment. Each
+# video keeps its comment IDs and a publishedAt watermark so a refresh only
+# has to pull threads newer than what is already on disk, and the comment
+# limit it was fetched with (fetch_limit, 0 once every comment was fetched)
+# and whether replies were (fetch_replies), so a request for more is not
+# served the shallower copy.
+
+STORE_DIR = os.environ.get("COMMENT_STORE_DIR", ".comment_store")
+STORE_FILE = "comments.sqlite3"
+
+COMMENT_COLUMNS = ["comment_id", "comment", "published_at", "like_count", "author", "parent_id", "depth"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    title TEXT,
+    url TEXT,
+    stats TEXT,
+    watermark TEXT,
+    updated_at TEXT,
+    fetch_limit INTEGER,
+    fetch_replies INTEGER
+);
+CREATE TABLE IF NOT EXISTS comments (
+    video_id TEXT NOT NULL,
+    comment_id TEXT NOT NULL,
+    comment TEXT,
+    published_at TEXT,
+    like_count INTEGER,
+    author TEXT,
+    parent_id TEXT,
+    depth INTEGER DEFAULT 0,
+    PRIMARY KEY (video_id, comment_id)
+);
+"""
+
+# Columns added after the first release; older store files are migrated
+# in place when opened.
+MIGRATIONS = {
+    "comments": {
+        "parent_id": "ALTER TABLE comments ADD COLUMN parent_id TEXT",
+        "depth": "ALTER TABLE comments ADD COLUMN depth INTEGER DEFAULT 0",
+    },
+    "videos": {
+        "fetch_limit": "ALTER TABLE videos ADD COLUMN fetch_limit INTEGER",
+        "fetch_replies": "ALTER TABLE videos ADD COLUMN fetch_replies INTEGER",
+    },
+}
+
+
+def store_path(store_dir=None):
+    return os.path.join(store_dir or STORE_DIR, STORE_FILE)
+
+
+def connect(store_dir=None):
+    path = store_path(store_dir)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, timeout=30)
+    con.executescript(SCHEMA)
+    for table, columns in MIGRATIONS.items():
+        have = {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+        for col, sql in columns.items():
+            if col not in have:
+                con.execute(sql)
+    return con
+
+
+def load_video(video_id, store_dir=None):
+    import pandas as pd
+
+    with closing(connect(store_dir)) as con:
+        row = con.execute(
+            "SELECT title, url, stats, watermark, updated_at, fetch_limit, fetch_replies FROM videos WHERE video_id = ?",
+            (video_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        df = pd.read_sql_query(
+            "SELECT comment_id, comment, published_at, like_count, author, parent_id, depth FROM comments "
+            "WHERE video_id = ? ORDER BY published_at DESC",
+            con,
+            params=(video_id,),
+        )
+
+    title, url, stats, watermark, updated_at, fetch_limit, fetch_replies = row
+    return {
+        "df": df,
+        "title": title,
+        "url": url,
+        "stats": json.loads(stats or "{}"),
+        "watermark": watermark,
+        "updated_at": updated_at,
+        "fetch_limit": fetch_limit,
+        "fetch_replies": None if fetch_replies is None else bool(fetch_replies),
+    }
+
+
+def known_ids(video_id, store_dir=None):
+    with closing(connect(store_dir)) as con:
+        rows = con.execute("SELECT comment_id FROM comments WHERE video_id = ?", (video_id,))
+        return {r[0] for r in rows}
+
+
+def stored_fetches(video_ids, store_dir=None):
+    # {video_id: {"fetch_limit", "fetch_replies", "rows", "has_replies"}} for
+    # the given videos with comments on disk, without loading the comments.
+    video_ids = list(video_ids)
+    if not video_ids:
+        return {}
+    with closing(connect(store_dir)) as con:
+        rows = con.execute(
+            "SELECT c.video_id, v.fetch_limit, v.fetch_replies, COUNT(*), MAX(c.depth) FROM comments c "
+            "LEFT JOIN videos v ON v.video_id = c.video_id "
+            "WHERE c.video_id IN (%s) GROUP BY c.video_id" % ",".join("?" * len(video_ids)),
+            video_ids,
+        )
+        return {
+            vid: {
+                "fetch_limit": limit,
+                "fetch_replies": None if replies is None else bool(replies),
+                "rows": n,
+                "has_replies": bool(depth),
+            }
+            for vid, limit, replies, n, depth in rows
+        }
+
+
+def watermark(video_id, store_dir=None):
+    with closing(connect(store_dir)) as con:
+        row = con.execute("SELECT watermark FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+    return row[0] if row else None
+
+
+def save_video(video_id, title, url, stats, columns, store_dir=None, fetch_limit=None, fetch_replies=None):
+    # fetch_limit (fetch_replies) None keeps the value already recorded, e.g.
+    # for a refresh that reached the stored comments.
+    rows = [
+        (video_id, cid, text or "", published or "", int(likes or 0), author or "Unknown", parent, int(depth or 0))
+        for cid, text, published, likes, author, parent, depth in zip(*(columns[k] for k in COMMENT_COLUMNS))
+        if cid
+    ]
+
+    with closing(connect(store_dir)) as con, con:
+        con.executemany(
+            "INSERT OR REPLACE INTO comments "
+            "(video_id, comment_id, comment, published_at, like_count, author, parent_id, depth) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        mark = con.execute(
+            "SELECT MAX(published_at) FROM comments WHERE video_id = ? AND depth = 0", (video_id,)
+        ).fetchone()[0]
+        prev = con.execute(
+            "SELECT fetch_limit, fetch_replies FROM videos WHERE video_id = ?", (video_id,)
+        ).fetchone() or (None, None)
+        if fetch_limit is None:
+            fetch_limit = prev[0]
+        if fetch_replies is None:
+            fetch_replies = prev[1]
+        con.execute(
+            "INSERT OR REPLACE INTO videos "
+            "(video_id, title, url, stats, watermark, updated_at, fetch_limit, fetch_replies) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                video_id,
+                title,
+                url,
+                json.dumps(stats or {}),
+                mark,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                fetch_limit,
+                None if fetch_replies is None else int(bool(fetch_replies)),
+            ),
+        )
+    return len(rows)
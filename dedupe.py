@@ -0,0 +1,181 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Duplicate and near-duplicate comment detection.
+#
+# score_keys() hashes comments with runs of spaces and tabs collapsed, which
+# the sentiment tokenizer ignores anyway, so comments sharing a key get the
+# same score and are scored once.
+#
+# duplicate_groups() is looser and only used for counting. Comments are
+# compared lowercased with links and punctuation stripped; identical
+# normalized texts form one group. Normalized texts of at least
+# NEAR_MIN_CHARS are also joined when the MinHash signatures of their byte
+# shingles estimate a Jaccard similarity of NEAR_THRESHOLD or more. The
+# signatures use one-permutation hashing (each shingle is hashed once into
+# one of SIGNATURE_BINS bins, empty bins borrow their right neighbour), so
+# the cost does not grow with the signature length. LSH banding finds the
+# candidates without comparing every pair: texts that agree on all bins of
+# any band share a bucket, and each is checked against the first text in it.
+
+NEAR_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# Shorter texts have too few shingles for a reliable estimate; two short
+# comments differing in one word would look alike.
+NEAR_MIN_CHARS = 32
+SHINGLE_BYTES = 5
+SIGNATURE_BINS = 32
+BANDS = 8
+CHUNK_TEXTS = 50_000
+
+EMPTY_BIN = np.uint32(0xFFFFFFFF)
+_BIN_SHIFT = np.uint64(64 - 5)
+_BAND_MIX = np.random.default_rng(20240601).integers(1, 2**63, SIGNATURE_BINS // BANDS, dtype=np.uint64) | np.uint64(1)
+
+
+def _arrow(texts):
+    # Arrow strings run the regexes below in C++ (RE2, Unicode classes).
+    if isinstance(texts, pd.Series) and texts.dtype == "string[pyarrow]":
+        return texts.reset_index(drop=True)
+    return pd.Series([str(t) for t in texts], dtype="string[pyarrow]")
+
+
+def _hashes(s):
+    return pd.util.hash_pandas_object(s, index=False).to_numpy()
+
+
+def score_keys(texts):
+    # -> (codes, first): comment i scores like comment first[codes[i]].
+    s = _arrow(texts)
+    s = s.str.replace(r"[ \t]+", " ", regex=True).str.strip(" \t")
+    codes, uniques = pd.factorize(_hashes(s))
+    first = np.full(len(uniques), len(codes), dtype=np.int64)
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    return codes, first
+
+
+def normalize(texts):
+    s = _arrow(texts).str.lower()
+    s = s.str.replace(r"https?://\S+|www\.\S+", " ", regex=True)
+    s = s.str.replace(r"[^\p{L}\p{N}]+", " ", regex=True)
+    return s.str.strip().astype(object)
+
+
+def minhash(texts):
+    # (len(texts), SIGNATURE_BINS) uint32 signatures over byte shingles;
+    # every text must be at least SHINGLE_BYTES long.
+    data = [t.encode("utf-8") for t in texts]
+    lengths = np.fromiter(map(len, data), dtype=np.int64, count=len(data))
+    buf = np.frombuffer(b"".join(data), dtype=np.uint8).astype(np.uint64)
+    counts = lengths - SHINGLE_BYTES + 1
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+
+    # Every byte window packed into one integer, then those starting inside
+    # a text (not straddling two) picked out.
+    width = len(buf) - SHINGLE_BYTES + 1
+    packed = np.zeros(width, dtype=np.uint64)
+    for k in range(SHINGLE_BYTES):
+        packed <<= np.uint64(8)
+        packed |= buf[k:k + width]
+    seg = np.r_[0, np.cumsum(counts)[:-1]]
+    h = packed[np.arange(counts.sum()) - np.repeat(seg - starts, counts)]
+
+    # splitmix64 finalizer: top bits pick the bin, low 32 bits are the value
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    slot = np.repeat(np.arange(len(texts)) * SIGNATURE_BINS, counts) + (h >> _BIN_SHIFT).astype(np.int64)
+    sig = np.full(len(texts) * SIGNATURE_BINS, EMPTY_BIN, dtype=np.uint32)
+    np.minimum.at(sig, slot, (h & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+    sig = sig.reshape(len(texts), SIGNATURE_BINS)
+
+    # Rotation densification: an empty bin takes the nearest non-empty bin to
+    # its right (circularly), offset by the distance so the two differ.
+    rows = np.flatnonzero((sig == EMPTY_BIN).any(axis=1))
+    if len(rows):
+        part = sig[rows]
+        out = part.copy()
+        empty = part == EMPTY_BIN
+        step = 1
+        while empty.any():
+            shifted = np.roll(part, -step, axis=1)
+            fill = empty & (shifted != EMPTY_BIN)
+            out[fill] = shifted[fill] + np.uint32((step * 0x9E3779B1) & 0xFFFFFFFF)
+            empty &= ~fill
+            step += 1
+        sig[rows] = out
+    return sig
+
+
+def _components(n, a, b):
+    # Connected components of the edges a[i]-b[i]: each node ends up labelled
+    # with the smallest node of its component (hooking plus pointer jumping).
+    labels = np.arange(n)
+    while len(a):
+        la, lb = labels[a], labels[b]
+        if (la == lb).all():
+            break
+        low = np.minimum(la, lb)
+        np.minimum.at(labels, la, low)
+        np.minimum.at(labels, lb, low)
+        while True:
+            jumped = labels[labels]
+            if (jumped == labels).all():
+                break
+            labels = jumped
+    return labels
+
+
+def near_duplicates(sig, threshold=NEAR_THRESHOLD):
+    # -> label per row; rows with the same label are near-duplicates.
+    rows = SIGNATURE_BINS // BANDS
+    a, b = [], []
+    for band in range(BANDS):
+        cols = sig[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        codes, _ = pd.factorize(cols @ _BAND_MIX)
+        first = np.full(codes.max() + 1 if len(codes) else 0, len(codes), dtype=np.int64)
+        np.minimum.at(first, codes, np.arange(len(codes)))
+        leader = first[codes]
+        cand = np.flatnonzero(leader != np.arange(len(codes)))
+        if not len(cand):
+            continue
+        similar = (sig[cand] == sig[leader[cand]]).mean(axis=1) >= threshold
+        a.append(cand[similar])
+        b.append(leader[cand[similar]])
+    if not a:
+        return np.arange(len(sig))
+    return _components(len(sig), np.concatenate(a), np.concatenate(b))
+
+
+def duplicate_groups(texts, keys=None, threshold=NEAR_THRESHOLD):
+    # -> int32 group per comment, numbered by first appearance. Normalizing
+    # runs once per score key (pass score_keys(texts) if already computed).
+    # Comments with nothing left after normalizing (emoji only, say) match
+    # exactly or not at all.
+    raw = _arrow(texts)
+    codes, first = keys if keys is not None else score_keys(raw)
+    if not len(raw):
+        return np.zeros(0, dtype=np.int32)
+    return pd.factorize(_groups(raw.iloc[first], threshold)[codes])[0].astype(np.int32)
+
+
+def _groups(raw, threshold):
+    norm = normalize(raw)
+    empty = (norm == "").to_numpy()
+    keys = np.where(empty, "\x00" + raw.str.strip().to_numpy(dtype=object), norm.to_numpy(dtype=object))
+    codes, uniques = pd.factorize(keys)
+    labels = np.arange(len(uniques))
+    u = pd.Series(uniques, dtype=object)
+    eligible = np.flatnonzero((u.str.len() >= NEAR_MIN_CHARS).to_numpy() & ~u.str.startswith("\x00").to_numpy(dtype=bool))
+    if len(eligible) > 1:
+        sig = np.concatenate(
+            [
+                minhash([uniques[i] for i in eligible[k:k + CHUNK_TEXTS]])
+                for k in range(0, len(eligible), CHUNK_TEXTS)
+            ]
+        )
+        labels[eligible] = eligible[near_duplicates(sig, threshold)]
+    return labels[codes]
@@ -0,0 +1,245 @@
+import contextvars
+import gzip
+import importlib.util
+import io
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+
+import metrics
+import pipeline
+
+# Export writers shared by the dashboard and the batch CLI. Frames are
+# written chunk by chunk (see pipeline.detailed_chunks), so an export never
+# needs a second full-size copy of a video's comments; pyarrow is only
+# imported when a Parquet file is actually written. ArchiveJob streams a
+# multi-video ZIP to a temporary file on a background thread.
+
+CSV_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "50000"))
+PARQUET_COMPRESSION = os.environ.get("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+# label -> (file extension, mime type)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_formats():
+    if importlib.util.find_spec("pyarrow") is None:
+        return [f for f in FORMATS if f != "Parquet"]
+    return list(FORMATS)
+
+
+def write_csv(chunks, fh, header=True):
+    # fh is a binary file object; returns the number of rows written.
+    text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+    rows = 0
+    try:
+        for chunk in chunks:
+            chunk.to_csv(text, header=header and rows == 0, index=False)
+            rows += len(chunk)
+        text.flush()
+    finally:
+        text.detach()
+    return rows
+
+
+def write_parquet(chunks, fh):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, rows = None, 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # A text column that is all None in the first chunk (parent_id
+                # before the first reply) comes out typed null; it is written
+                # as string and every chunk is cast to that schema.
+                schema = pa.schema(
+                    [f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in table.schema],
+                    metadata=table.schema.metadata,
+                )
+                writer = pq.ParquetWriter(fh, schema, compression=PARQUET_COMPRESSION)
+            writer.write_table(table.cast(schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_export(chunks, fh, fmt):
+    if fmt == "Parquet":
+        return write_parquet(chunks, fh)
+    if fmt == "CSV (gzip)":
+        # mtime=0 keeps the bytes identical for identical data.
+        with gzip.GzipFile(fileobj=fh, mode="wb", compresslevel=6, mtime=0) as gz:
+            return write_csv(chunks, gz)
+    return write_csv(chunks, fh)
+
+
+def export_bytes(chunks, fmt):
+    buf = io.BytesIO()
+    write_export(chunks, buf, fmt)
+    return buf.getvalue()
+
+
+def file_name(prefix, fmt, stamp):
+    return f"{prefix}_{stamp}.{FORMATS[fmt][0]}"
+
+
+def mime_type(fmt):
+    return FORMATS[fmt][1]
+
+
+class ArchiveCancelled(Exception):
+    pass
+
+
+def write_archive(
+    fh,
+    videos,
+    comparison=None,
+    fmt="CSV",
+    on_progress=None,
+    generated_at=None,
+    once=False,
+    include_replies=True,
+    cancel=None,
+):
+    # videos: list of (video_id, title, scored frame). Each member is
+    # streamed into the ZIP; compressed formats are stored as they are.
+    # once keeps one comment per duplicate group. Without replies the
+    # comparison (built from cached aggregates that count them) is rebuilt
+    # from the frames written. Setting the cancel event stops the write with
+    # ArchiveCancelled before the next chunk.
+    generated_at = generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ext = FORMATS[fmt][0]
+    compression = zipfile.ZIP_DEFLATED if fmt == "CSV" else zipfile.ZIP_STORED
+    stamp = time.localtime()[:6]
+
+    def checked(chunks):
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                raise ArchiveCancelled("Cancelled")
+            yield chunk
+
+    def member(name, chunks):
+        info = zipfile.ZipInfo(name, date_time=stamp)
+        info.compress_type = compression
+        with zf.open(info, "w", force_zip64=True) as out:
+            write_export(checked(chunks), out, fmt)
+
+    rows, compared = [], []
+    with zipfile.ZipFile(fh, "w") as zf:
+        for n, (vid, title, df) in enumerate(videos):
+            if on_progress:
+                on_progress(n, len(videos), title)
+            df = pipeline.filter_replies(df, include_replies)
+            if once:
+                df = pipeline.collapse_duplicates(df)
+            member(f"detailed/{vid}.{ext}", pipeline.detailed_chunks(vid, title, df, generated_at, CSV_CHUNK_ROWS))
+            rows.append(pipeline.summary_row(vid, title, df, generated_at))
+            if not include_replies and not df.empty:
+                compared.append(pipeline.comparison_row(title, pipeline.sentiment_aggregate(df)))
+        member(f"summary.{ext}", [pd.DataFrame(rows)])
+        if not include_replies:
+            comparison = pd.DataFrame(compared) if compared else None
+        if comparison is not None:
+            member(f"comparison.{ext}", [comparison])
+    if on_progress:
+        on_progress(len(videos), len(videos), "Done")
+
+
+class ArchiveJob:
+    # Builds an export archive on a daemon thread. The thread only reads the
+    # frames it was given; the UI polls done/total/status and reads path
+    # once finished is set. discard() also works mid-build: the worker stops
+    # before its next chunk and deletes its file.
+
+    def __init__(self, videos, comparison=None, fmt="CSV", once=False, include_replies=True):
+        self.videos = videos
+        self.video_ids = [vid for vid, _, _ in videos]
+        self.comparison = comparison
+        self.fmt = fmt
+        self.once = once
+        self.include_replies = include_replies
+        self.done = 0
+        self.total = len(videos)
+        self.status = "Queued"
+        self.error = None
+        self.path = None
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.finished = threading.Event()
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Copy the caller's context so stage timings land in its session.
+        ctx = contextvars.copy_context()
+        threading.Thread(target=ctx.run, args=(self._run,), daemon=True).start()
+        return self
+
+    def _progress(self, done, total, status):
+        self.done, self.total, self.status = done, total, status
+
+    def _run(self):
+        fd, path = tempfile.mkstemp(prefix="youtube_export_", suffix=".zip")
+        try:
+            with os.fdopen(fd, "wb") as fh, metrics.timer("export_archive"):
+                write_archive(
+                    fh,
+                    self.videos,
+                    self.comparison,
+                    self.fmt,
+                    on_progress=self._progress,
+                    once=self.once,
+                    include_replies=self.include_replies,
+                    cancel=self.cancelled,
+                )
+            with self._lock:
+                if not self.cancelled.is_set():
+                    self.path, path = path, None
+            remove_file(path)
+        except ArchiveCancelled:
+            self.status = "Cancelled"
+            remove_file(path)
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            self.status = "Failed"
+            remove_file(path)
+        finally:
+            self.videos = None
+            self.elapsed = time.time() - self.started
+            self.finished.set()
+
+    def size(self):
+        return os.path.getsize(self.path) if self.path and os.path.exists(self.path) else 0
+
+    def read(self):
+        with open(self.path, "rb") as fh:
+            return fh.read()
+
+    def discard(self):
+        with self._lock:
+            self.cancelled.set()
+            path, self.path = self.path, None
+        remove_file(path)
+
+
+def remove_file(path):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,156 @@
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import comment_store
+
+# Stage timing histograms. Every timed stage is recorded process-wide and,
+# when a session registry is active in the current context, per session too.
+# The process registry can be written out in Prometheus text format for a
+# local scraper (node_exporter textfile collector or similar).
+
+METRICS_FILE = os.environ.get("METRICS_FILE") or os.path.join(comment_store.STORE_DIR, "metrics.prom")
+METRICS_WRITE_SECONDS = float(os.environ.get("METRICS_WRITE_SECONDS", "10"))
+METRIC_NAME = "ytsa_stage_seconds"
+
+# Upper bounds in seconds; an implicit +Inf bucket follows.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th observation,
+        # the same estimate Prometheus' histogram_quantile() makes.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lo + (hi - lo) * (rank - seen) / n)
+            seen += n
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            h = self.histograms.get(stage)
+            if h is None:
+                h = self.histograms[stage] = Histogram()
+            h.observe(seconds)
+
+    def summary(self):
+        with self._lock:
+            rows = [
+                {
+                    "Stage": stage,
+                    "Count": h.count,
+                    "Mean ms": h.sum / h.count * 1000,
+                    "p50 ms": h.quantile(0.5) * 1000,
+                    "p95 ms": h.quantile(0.95) * 1000,
+                    "p99 ms": h.quantile(0.99) * 1000,
+                    "Max ms": h.max * 1000,
+                    "Total s": h.sum,
+                }
+                for stage, h in self.histograms.items()
+                if h.count
+            ]
+        return sorted(rows, key=lambda r: -r["Total s"])
+
+    def prometheus_text(self):
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent per dashboard and pipeline stage.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += n
+                    le = bound if bound == "+Inf" else repr(float(bound))
+                    lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+
+PROCESS = Registry()
+SESSION = contextvars.ContextVar("metrics_session", default=None)
+_last_write = 0.0
+_write_lock = threading.Lock()
+
+
+def use_session(registry):
+    SESSION.set(registry)
+
+
+def observe(stage, seconds):
+    PROCESS.observe(stage, seconds)
+    session = SESSION.get()
+    if session is not None:
+        session.observe(stage, seconds)
+
+
+@contextmanager
+def timer(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0)
+
+
+def timed(stage):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+
+        return inner
+
+    return wrap
+
+
+def write_prometheus(path=None, force=False):
+    # Throttled: a busy dashboard reruns far more often than a scraper reads.
+    global _last_write
+    path = path or METRICS_FILE
+    with _write_lock:
+        now = time.monotonic()
+        if not force and now - _last_write < METRICS_WRITE_SECONDS:
+            return False
+        _last_write = now
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(PROCESS.prometheus_text())
+        os.replace(tmp, path)
+    except OSError:
+        return False
+    return True
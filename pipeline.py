@@ -0,0 +1,873 @@
+import contextvars
+import hashlib
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import comment_store
+import dedupe
+import metrics
+import quota
+import sentiment_engine
+
+# Fetch and scoring pipeline shared by the Streamlit app and the batch CLI.
+# Nothing here touches Streamlit: functions take a YouTube client and plain
+# values and return frames or payload dicts, so they run the same from a
+# worker thread, a cron job or a dashboard session.
+
+MAX_COMMENTS = int(os.environ.get("MAX_COMMENTS", "500"))
+REPLY_FETCH_WORKERS = int(os.environ.get("REPLY_FETCH_WORKERS", "8"))
+MAX_REPLIES_PER_THREAD = int(os.environ.get("MAX_REPLIES_PER_THREAD", "500"))
+BULK_FETCH_WORKERS = int(os.environ.get("BULK_FETCH_WORKERS", "4"))
+CHANNEL_DAYS = int(os.environ.get("CHANNEL_DAYS", "90"))
+CHANNEL_MAX_VIDEOS = int(os.environ.get("CHANNEL_MAX_VIDEOS", "200"))
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", "1"))
+SCORING_CHUNK_SIZE = int(os.environ.get("SCORING_CHUNK_SIZE", sentiment_engine.PARALLEL_CHUNK_SIZE))
+SCORING_PARALLEL_MIN = int(os.environ.get("SCORING_PARALLEL_MIN", sentiment_engine.PARALLEL_MIN_COMMENTS))
+
+# Columns with_scores adds to a comment frame.
+SCORE_COLUMNS = ["sentiment_score", "sentiment", "dup_group"]
+
+# playlistItems.list pages and videos.list ID batches are capped at 50.
+ID_BATCH_SIZE = 50
+
+# Timeline granularities -> pandas offsets; weeks start on Monday.
+TIMELINE_FREQS = {"Hourly": "h", "Daily": "D", "Weekly": "W-MON"}
+
+
+def extract_video_id(url):
+    if re.fullmatch(r"[0-9A-Za-z_-]{11}", url.strip()):
+        return url.strip()
+    patterns = [
+        r"(?:v=|\/)([0-9A-Za-z_-]{11})",
+        r"youtu\.be\/([0-9A-Za-z_-]{11})",
+        r"embed\/([0-9A-Za-z_-]{11})",
+    ]
+    for pattern in patterns:
+        m = re.search(pattern, url)
+        if m:
+            return m.group(1)
+    return None
+
+
+def parse_video_urls(text):
+    ids, invalid, seen = [], [], set()
+    for token in re.split(r"[\s,;]+", text or ""):
+        token = token.strip().strip("\"'")
+        if not token:
+            continue
+        vid = extract_video_id(token)
+        if not vid:
+            invalid.append(token)
+        elif vid not in seen:
+            seen.add(vid)
+            ids.append((vid, token))
+    return ids, invalid
+
+
+def parse_inputs(text):
+    # parse_video_urls, with channel and playlist links returned separately
+    # as extract_source tuples. A watch link inside a playlist is the video.
+    sources, rest = [], []
+    for token in re.split(r"[\s,;]+", text or ""):
+        token = token.strip().strip("\"'")
+        source = extract_source(token) if token and "v=" not in token and "youtu.be/" not in token else None
+        if source is None:
+            rest.append(token)
+        elif source not in sources:
+            sources.append(source)
+    ids, invalid = parse_video_urls("\n".join(rest))
+    return ids, sources, invalid
+
+
+def extract_source(url):
+    # Channel or playlist link -> (kind, value): ("playlist", id) or a
+    # channels.list filter ("id", "forHandle", "forUsername"). Legacy /c/
+    # custom URLs have no API lookup; they almost always match the handle.
+    url = (url or "").strip()
+    if re.fullmatch(r"UC[0-9A-Za-z_-]{22}", url):
+        return "id", url
+    if re.fullmatch(r"(?:PL|UU|OL|FL|LL|RD)[0-9A-Za-z_-]{10,}", url):
+        return "playlist", url
+    if re.fullmatch(r"@[\w.-]+", url):
+        return "forHandle", url
+    patterns = [
+        ("playlist", r"[?&]list=([0-9A-Za-z_-]{10,})"),
+        ("id", r"/channel/(UC[0-9A-Za-z_-]{22})"),
+        ("forHandle", r"/(@[\w.-]+)"),
+        ("forUsername", r"/user/([\w.-]+)"),
+        ("forHandle", r"/c/([\w.-]+)"),
+    ]
+    for kind, pattern in patterns:
+        m = re.search(pattern, url)
+        if m:
+            return kind, m.group(1)
+    return None
+
+
+def new_comment_columns():
+    return {k: [] for k in comment_store.COMMENT_COLUMNS}
+
+
+def extend_columns(columns, page):
+    for k, values in page.items():
+        columns[k].extend(values)
+
+
+@metrics.timed("comments_frame")
+def comments_frame(columns):
+    # Compact layout: one buffer per column, categorical authors, int32 likes
+    # and datetime64 timestamps instead of object columns of Python values.
+    df = pd.DataFrame(
+        {
+            "comment_id": pd.Series(columns["comment_id"], dtype=object),
+            "comment": pd.Series(columns["comment"], dtype=object).fillna(""),
+            "published_at": pd.to_datetime(pd.Series(columns["published_at"], dtype=object), errors="coerce", utc=True),
+            "like_count": pd.to_numeric(pd.Series(columns["like_count"], dtype=object), errors="coerce").fillna(0).astype("int32"),
+            "author": pd.Series(columns["author"], dtype=object).fillna("Unknown").astype("category"),
+            "parent_id": pd.Series(columns["parent_id"], dtype=object),
+            "depth": pd.to_numeric(pd.Series(columns["depth"], dtype=object), errors="coerce").fillna(0).astype("int8"),
+        }
+    )
+    return df
+
+
+def filter_replies(df, include):
+    if include or df is None or "depth" not in df.columns:
+        return df
+    return df[df["depth"] == 0]
+
+
+def has_replies(df):
+    return df is not None and "depth" in df.columns and bool((df["depth"] > 0).any())
+
+
+def frame_bytes(df):
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def add_comment(columns, c, cid, parent_id=None, depth=0):
+    columns["comment_id"].append(cid)
+    columns["comment"].append(c.get("textDisplay", ""))
+    columns["published_at"].append(c.get("publishedAt", ""))
+    columns["like_count"].append(c.get("likeCount", 0))
+    columns["author"].append(c.get("authorDisplayName", "Unknown"))
+    columns["parent_id"].append(parent_id)
+    columns["depth"].append(depth)
+
+
+def get_thread_replies(youtube, thread_id, max_replies=MAX_REPLIES_PER_THREAD):
+    replies = new_comment_columns()
+    next_page_token = None
+
+    while len(replies["comment_id"]) < max_replies:
+        request = youtube.comments().list(
+            part="snippet",
+            parentId=thread_id,
+            maxResults=100,
+            pageToken=next_page_token,
+            textFormat="plainText",
+        )
+        response = quota.execute(request)
+
+        for item in response.get("items", []):
+            add_comment(replies, item["snippet"], item.get("id"), parent_id=thread_id, depth=1)
+
+        next_page_token = response.get("nextPageToken")
+        if not next_page_token:
+            break
+
+    return replies
+
+
+def fetch_thread_replies(youtube, threads, seen):
+    # threads: {thread_id: inline reply columns}. Each thread is fetched at
+    # most once per video (seen), on a bounded pool; if the full fetch fails
+    # the inline replies that came with the thread are kept instead.
+    todo = [t for t in threads if t not in seen]
+    seen.update(todo)
+    out = new_comment_columns()
+    if not todo:
+        return out
+
+    with ThreadPoolExecutor(max_workers=max(1, min(REPLY_FETCH_WORKERS, len(todo)))) as pool:
+        futures = {pool.submit(get_thread_replies, youtube, t): t for t in todo}
+        for fut in futures:
+            try:
+                extend_columns(out, fut.result())
+            except Exception:
+                extend_columns(out, threads[futures[fut]])
+    return out
+
+
+def parse_thread_page(response, known=(), since=None, replies=False):
+    # One commentThreads.list response -> (page columns, threads whose
+    # replies were cut off {thread_id: inline reply columns}, whether an
+    # already stored comment was reached).
+    page = new_comment_columns()
+    partial_threads = {}
+    reached_known = False
+    for item in response.get("items", []):
+        top = item["snippet"]["topLevelComment"]
+        s = top["snippet"]
+        cid = top.get("id") or item.get("id")
+        published = s.get("publishedAt", "")
+        if cid in known or (since and published and published < since):
+            reached_known = True
+            continue
+        add_comment(page, s, cid)
+
+        if not replies:
+            continue
+        inline = new_comment_columns()
+        for r in item.get("replies", {}).get("comments", []):
+            add_comment(inline, r["snippet"], r.get("id"), parent_id=item.get("id"), depth=1)
+        if item["snippet"].get("totalReplyCount", 0) > len(inline["comment_id"]):
+            partial_threads[item.get("id")] = inline
+        else:
+            extend_columns(page, inline)
+    return page, partial_threads, reached_known
+
+
+def iter_comment_pages(youtube, video_id, max_comments=500, since=None, known=None, replies=False):
+    fetched = 0
+    next_page_token = None
+    known = known or set()
+    seen_threads = set()
+
+    while fetched < max_comments:
+        request = youtube.commentThreads().list(
+            part="snippet,replies" if replies else "snippet",
+            videoId=video_id,
+            maxResults=100,
+            pageToken=next_page_token,
+            textFormat="plainText",
+            order="time",
+        )
+        response = quota.execute(request)
+
+        page, partial_threads, reached_known = parse_thread_page(response, known, since, replies)
+        if partial_threads:
+            extend_columns(page, fetch_thread_replies(youtube, partial_threads, seen_threads))
+
+        fetched += len(page["comment_id"])
+        yield page
+
+        next_page_token = response.get("nextPageToken")
+        if reached_known or not next_page_token:
+            return
+
+
+@metrics.timed("get_video_comments")
+def get_video_comments(youtube, video_id, max_comments=500, since=None, known=None, on_page=None, replies=False):
+    all_comments = new_comment_columns()
+    try:
+        for page in iter_comment_pages(youtube, video_id, max_comments, since, known, replies=replies):
+            extend_columns(all_comments, page)
+            if on_page is not None:
+                on_page(len(all_comments["comment_id"]))
+    except Exception as e:
+        # Transient errors were already retried by the scheduler; anything
+        # left is surfaced instead of silently truncating the comments.
+        if "commentsDisabled" in str(e):
+            return new_comment_columns()
+        raise
+
+    return all_comments
+
+
+def video_payload(df, title, video_url, stats, **extra):
+    return {
+        "df": df,
+        "title": title,
+        "url": video_url,
+        "stats": stats,
+        "memory_bytes": frame_bytes(df),
+        **extra,
+    }
+
+
+def stored_payload(stored, video_url=None):
+    df = comments_frame(stored["df"])
+    return video_payload(
+        df,
+        stored["title"] or "Unknown Title",
+        video_url or stored["url"],
+        stored["stats"],
+        fetch_limit=stored.get("fetch_limit"),
+        fetch_replies=stored.get("fetch_replies"),
+    )
+
+
+def fetch_depth(columns, max_comments, full=True):
+    # fetch_limit to record after fetching `columns`: 0 when a full fetch ran
+    # out of comments before the limit (every comment is then stored), else
+    # the limit. A refresh that reached the stored comments leaves the
+    # recorded limit as it was (None).
+    if len(columns["comment_id"]) < max_comments:
+        return 0 if full else None
+    return max_comments
+
+
+def fetched_replies(data):
+    # Videos stored before fetch_replies was recorded were fetched with
+    # replies if they have any.
+    flag = data.get("fetch_replies")
+    if flag is None:
+        return data["has_replies"] if "has_replies" in data else has_replies(data["df"])
+    return bool(flag)
+
+
+def covers(data, max_comments, replies=False):
+    # Whether a stored video, payload or stored_fetches entry was fetched
+    # deep enough for max_comments, and with replies if they are wanted.
+    # Videos stored before fetch_limit was recorded count as fetched down to
+    # the comments they have.
+    if replies and not fetched_replies(data):
+        return False
+    limit = data.get("fetch_limit")
+    if limit is None:
+        limit = data["rows"] if "rows" in data else len(data["df"])
+    return limit == 0 or limit >= max_comments
+
+
+def fetch_mode(stored, max_comments, replies):
+    # -> (full, replies) for downloading a video over its stored copy. A copy
+    # that does not cover the request is fetched again from the newest
+    # comment; a refresh stops at the stored comments and could never reach
+    # older ones or add replies to old threads. Replies stay on once a video
+    # was fetched with them.
+    if stored is None or stored["df"].empty:
+        return True, replies
+    replies = replies or fetched_replies(stored)
+    return not covers(stored, max_comments, replies), replies
+
+
+def load_stored(video_id):
+    try:
+        return comment_store.load_video(video_id)
+    except Exception:
+        return None
+
+
+def stored_video(video_id, video_url=None, max_comments=None, replies=False):
+    stored = load_stored(video_id)
+    if stored is None or stored["df"].empty:
+        return None
+    if max_comments is not None and not covers(stored, max_comments, replies):
+        return None
+    return stored_payload(stored, video_url)
+
+
+def payload_bytes(payload):
+    return payload.get("memory_bytes", 0) if payload else 0
+
+
+class FetchError(Exception):
+    pass
+
+
+def fetch_error_message(e):
+    if isinstance(e, (FetchError, quota.QuotaError)):
+        return str(e)
+
+    msg = str(e)
+    if "commentsDisabled" in msg:
+        return "This video has comments disabled. Pick another video."
+    if "quotaExceeded" in msg:
+        return "YouTube API quota exceeded. Try again later or use a new API key/project."
+    if "keyInvalid" in msg or "API key not valid" in msg:
+        return "Your YouTube API key is invalid. Check st.secrets['youtube_api_key'] (or --api-key for the CLI)."
+    if "accessNotConfigured" in msg:
+        return "YouTube Data API v3 is not enabled for this Google Cloud project."
+    if "forbidden" in msg or "403" in msg:
+        return "Request forbidden (403). Video may be restricted/private or comments unavailable."
+    return f"Error fetching data: {msg}"
+
+
+def video_info(yt, video_id):
+    vr = quota.execute(yt.videos().list(part="snippet,statistics,status", id=video_id))
+    if not vr.get("items"):
+        raise FetchError("Video not found or not accessible.")
+
+    info = vr["items"][0]
+    return info.get("snippet", {}).get("title", "Unknown Title"), info.get("statistics", {})
+
+
+def resolve_source(yt, source):
+    # -> {"kind", "id", "title", "playlist_id", "uploads"}; a channel is
+    # read through its uploads playlist.
+    kind, value = source
+    if kind == "playlist":
+        r = quota.execute(yt.playlists().list(part="snippet", id=value, fields="items(id,snippet/title,snippet/channelTitle)"))
+        if not r.get("items"):
+            raise FetchError("Playlist not found or private.")
+        snippet = r["items"][0].get("snippet", {})
+        title = snippet.get("title") or value
+        if snippet.get("channelTitle"):
+            title += f" ({snippet['channelTitle']})"
+        return {"kind": "playlist", "id": value, "title": title, "playlist_id": value, "uploads": value.startswith("UU")}
+
+    r = quota.execute(
+        yt.channels().list(
+            part="snippet,contentDetails",
+            fields="items(id,snippet/title,contentDetails/relatedPlaylists/uploads)",
+            **{kind: value},
+        )
+    )
+    if not r.get("items"):
+        raise FetchError("Channel not found.")
+    item = r["items"][0]
+    uploads = item.get("contentDetails", {}).get("relatedPlaylists", {}).get("uploads")
+    if not uploads:
+        raise FetchError("This channel has no public uploads.")
+    return {
+        "kind": "channel",
+        "id": item["id"],
+        "title": item.get("snippet", {}).get("title") or item["id"],
+        "playlist_id": uploads,
+        "uploads": True,
+    }
+
+
+def playlist_batches(yt, playlist_id, since=None, newest_first=False):
+    # Yields lists of (video_id, published_at), one playlistItems page (50
+    # IDs) at a time. Uploads playlists are newest first, so paging stops at
+    # the first page that reaches past `since`; other playlists are filtered.
+    token = None
+    while True:
+        r = quota.execute(
+            yt.playlistItems().list(
+                part="contentDetails",
+                playlistId=playlist_id,
+                maxResults=ID_BATCH_SIZE,
+                pageToken=token,
+                fields="nextPageToken,items/contentDetails(videoId,videoPublishedAt)",
+            )
+        )
+        batch, older = [], False
+        for item in r.get("items", []):
+            details = item.get("contentDetails", {})
+            published = details.get("videoPublishedAt")
+            # Private and deleted videos stay listed without a publish date.
+            if not details.get("videoId") or not published:
+                continue
+            if since and published < since:
+                older = True
+                continue
+            batch.append((details["videoId"], published))
+        if batch:
+            yield batch
+        token = r.get("nextPageToken")
+        if not token or (older and newest_first):
+            return
+
+
+def video_details(yt, video_ids):
+    # One videos.list call (1 unit) per 50 IDs instead of one per video.
+    video_ids = list(video_ids)
+    out = {}
+    for start in range(0, len(video_ids), ID_BATCH_SIZE):
+        r = quota.execute(
+            yt.videos().list(
+                part="snippet,statistics",
+                id=",".join(video_ids[start:start + ID_BATCH_SIZE]),
+                maxResults=ID_BATCH_SIZE,
+                fields="items(id,snippet(title,publishedAt),statistics)",
+            )
+        )
+        for item in r.get("items", []):
+            out[item["id"]] = {
+                "title": item.get("snippet", {}).get("title", "Unknown Title"),
+                "stats": item.get("statistics", {}),
+                "published_at": item.get("snippet", {}).get("publishedAt"),
+            }
+    return out
+
+
+def published_since(days):
+    # RFC 3339 cutoff comparable with the API's publishedAt strings.
+    if not days:
+        return None
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def source_videos(yt, source, since=None, limit=CHANNEL_MAX_VIDEOS, on_batch=None):
+    # Video details of a resolved channel or playlist, newest listed first.
+    # Videos with comments disabled (no commentCount) or none yet are left
+    # out. on_batch(listed, kept) runs after each batch of 50.
+    infos, listed = {}, 0
+    for batch in playlist_batches(yt, source["playlist_id"], since=since, newest_first=source["uploads"]):
+        # A videos.list call costs the same for 1 or 50 IDs, so the whole
+        # batch is looked up and the limit applied to what is kept.
+        listed += len(batch)
+        details = video_details(yt, [vid for vid, _ in batch if vid not in infos])
+        for vid, _ in batch:
+            info = details.get(vid)
+            if info is not None and int(info["stats"].get("commentCount") or 0) > 0 and len(infos) < limit:
+                infos[vid] = info
+        if on_batch is not None:
+            on_batch(listed, len(infos))
+        if len(infos) >= limit:
+            break
+    return infos
+
+
+@metrics.timed("download_video")
+def download_video(yt, video_id, video_url, stored=None, on_page=None, max_comments=MAX_COMMENTS, replies=False, info=None):
+    # info: the video's details from video_details, saving the lookup.
+    if info is not None:
+        title, stats = info["title"], info["stats"]
+    else:
+        title, stats = video_info(yt, video_id)
+
+    full, replies = fetch_mode(stored, max_comments, replies)
+    if full:
+        comments = get_video_comments(yt, video_id, max_comments=max_comments, on_page=on_page, replies=replies)
+        if not comments["comment_id"]:
+            raise FetchError("No comments returned. Comments may be disabled for this video.")
+    else:
+        comments = get_video_comments(
+            yt,
+            video_id,
+            max_comments=max_comments,
+            since=stored["watermark"],
+            known=set(stored["df"]["comment_id"]),
+            on_page=on_page,
+            replies=replies,
+        )
+
+    depth = fetch_depth(comments, max_comments, full)
+    try:
+        comment_store.save_video(
+            video_id, title, video_url, stats, comments, fetch_limit=depth, fetch_replies=replies
+        )
+        stored = comment_store.load_video(video_id)
+    except Exception:
+        stored = None
+
+    if stored is not None:
+        return stored_payload(stored, video_url)
+
+    return video_payload(
+        comments_frame(comments), title, video_url, stats, fetch_limit=depth, fetch_replies=replies
+    )
+
+
+def fetch_video_task(video_id, video_url, yt, on_page=None, max_comments=MAX_COMMENTS, replies=False, info=None):
+    # Runs on a worker thread. The shared client is safe here
+    # because its pooled transport never hands one connection to two threads.
+    stored = load_stored(video_id)
+    if stored is not None and not stored["df"].empty and covers(stored, max_comments, replies):
+        return stored_payload(stored, video_url)
+    return download_video(
+        yt, video_id, video_url, stored, on_page=on_page, max_comments=max_comments, replies=replies, info=info
+    )
+
+
+def load_covering(cache, video_id, loader, max_comments, replies=False, refresh=False):
+    # cache.load for a video payload that must cover the request. A cached
+    # (or in-flight) payload fetched with a lower limit or without wanted
+    # replies is loaded again, and the deeper payload replaces it. Bounded:
+    # a loader that cannot do better is not retried forever.
+    payload = cache.load(video_id, loader, sizeof=payload_bytes, refresh=refresh)
+    for _ in range(2):
+        if payload is None or covers(payload, max_comments, replies):
+            break
+        payload = cache.load(video_id, loader, sizeof=payload_bytes, refresh=True)
+    return payload
+
+
+def video_task(video_id, video_url, yt, cache=None, **kwargs):
+    # With a shared_cache.SharedCache, videos another caller already loaded
+    # (or is loading right now) are not fetched again if they cover this
+    # request's limit and replies.
+    if cache is None:
+        return fetch_video_task(video_id, video_url, yt, **kwargs)
+    return load_covering(
+        cache,
+        video_id,
+        lambda: fetch_video_task(video_id, video_url, yt, **kwargs),
+        kwargs.get("max_comments", MAX_COMMENTS),
+        kwargs.get("replies", False),
+    )
+
+
+@metrics.timed("analyze_sentiment")
+def analyze_sentiment(df, workers=None):
+    if df is None or df.empty:
+        return df
+
+    # Copies of a comment (up to spacing) are hashed to one key and scored
+    # once; the same keys seed the duplicate grouping.
+    keys = dedupe.score_keys(df["comment"])
+    codes, first = keys
+    scores = sentiment_engine.polarity_parallel(
+        df["comment"].iloc[first],
+        workers=SCORING_WORKERS if workers is None else workers,
+        chunk_size=SCORING_CHUNK_SIZE,
+        min_size=SCORING_PARALLEL_MIN,
+    )
+    return with_scores(df, np.asarray(scores, dtype=float)[codes], duplicate_groups(df, keys))
+
+
+@metrics.timed("duplicate_groups")
+def duplicate_groups(df, keys=None):
+    return dedupe.duplicate_groups(df["comment"], keys)
+
+
+def with_scores(df, scores, groups=None):
+    # Shallow copy: the scored frame shares the comment buffers with the raw
+    # one and only adds a float32 score, a categorical label and an int32
+    # duplicate group column.
+    out = df.copy(deep=False)
+    scores = np.asarray(scores, dtype=float)
+    out["sentiment_score"] = scores.astype("float32")
+    out["sentiment"] = pd.Categorical(
+        sentiment_engine.labels(scores),
+        categories=sentiment_engine.SENTIMENT_LABELS,
+    )
+    if groups is not None:
+        out["dup_group"] = np.asarray(groups, dtype=np.int32)
+    return out
+
+
+def collapse_duplicates(df):
+    # One row per duplicate group (its first comment), so copy-paste
+    # campaigns count once.
+    if df is None or "dup_group" not in df:
+        return df
+    return df[~df["dup_group"].duplicated().to_numpy()]
+
+
+def duplicate_count(df):
+    # Comments beyond the first of their group.
+    if df is None or "dup_group" not in df or df.empty:
+        return 0
+    return len(df) - df["dup_group"].nunique()
+
+
+def comments_hash(df):
+    h = pd.util.hash_pandas_object(df["comment"].astype(str), index=False).values
+    return hashlib.sha256(h.tobytes()).hexdigest()[:16]
+
+
+def fetch_many(
+    yt, items, max_comments=MAX_COMMENTS, replies=False, workers=BULK_FETCH_WORKERS, on_progress=None, cache=None, infos=None
+):
+    # Yields (video_id, payload, error_message) as fetches finish. At most
+    # 2 x workers fetches are in flight, so a long list never holds more than
+    # a handful of finished payloads the caller has not consumed yet.
+    # on_progress(status, finished, total) runs on the caller's thread.
+    # infos maps video IDs to video_details results fetched in batches.
+    infos = infos or {}
+    status = {vid: "Queued" for vid, _ in items}
+    total, finished = len(items), 0
+
+    def task(vid, url):
+        status[vid] = "Fetching"
+
+        def on_page(n):
+            status[vid] = f"Fetching • {n:,} comments"
+
+        return video_task(
+            vid, url, yt, cache=cache, on_page=on_page, max_comments=max_comments, replies=replies, info=infos.get(vid)
+        )
+
+    queue = iter(items)
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        while True:
+            for vid, url in queue:
+                # Carry the caller's context so stage timings land in its session.
+                pending[pool.submit(contextvars.copy_context().run, task, vid, url)] = vid
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                return
+
+            done, _ = wait(list(pending), timeout=0.25, return_when=FIRST_COMPLETED)
+            for fut in done:
+                vid = pending.pop(fut)
+                finished += 1
+                try:
+                    payload = fut.result()
+                except Exception as e:
+                    status[vid] = f"Failed • {fetch_error_message(e)}"
+                    yield vid, None, fetch_error_message(e)
+                else:
+                    status[vid] = f"Done • {len(payload['df']):,} comments"
+                    yield vid, payload, None
+            if on_progress is not None:
+                on_progress(status, finished, total)
+
+
+def units_needed(items, max_comments=MAX_COMMENTS, infos=None, replies=False):
+    # Videos already in the comment store, fetched at least this deep (and
+    # with replies if wanted), are served without API calls. With batched details the videos.list call is
+    # already paid and the comment count bounds the pages needed.
+    try:
+        stored = comment_store.stored_fetches(vid for vid, _ in items)
+    except Exception:
+        stored = {}
+    todo = [vid for vid, _ in items if vid not in stored or not covers(stored[vid], max_comments, replies)]
+    if not infos:
+        return quota.estimate_units(max_comments, videos=len(todo)) if todo else 0
+    units = 0
+    for vid in todo:
+        info = infos.get(vid)
+        if info is None:
+            units += quota.estimate_units(max_comments)
+        else:
+            units += quota.estimate_units(min(max_comments, int(info["stats"].get("commentCount") or 0))) - 1
+    return units
+
+
+def source_units(limit=CHANNEL_MAX_VIDEOS):
+    # Listing cost: the channel or playlist lookup, then one playlistItems
+    # and one videos.list call per 50 videos.
+    return 1 + 2 * max(1, -(-limit // ID_BATCH_SIZE))
+
+
+def sentiment_aggregate(df):
+    # Per-video totals read by Metrics and Compare instead of rescanning the
+    # comments. Likes weight a comment as likes + 1 so unliked comments count.
+    if df is None or df.empty:
+        return empty_aggregate()
+    scores = df["sentiment_score"].to_numpy(dtype=np.float64)
+    weights = df["like_count"].to_numpy(dtype=np.float64) + 1
+    counts = df["sentiment"].value_counts()
+    return {
+        "count": len(df),
+        "score_sum": float(scores.sum()),
+        "weight_sum": float(weights.sum()),
+        "weighted_score_sum": float(scores @ weights),
+        "labels": {k: int(counts.get(k, 0)) for k in sentiment_engine.SENTIMENT_LABELS},
+    }
+
+
+def empty_aggregate():
+    return {
+        "count": 0,
+        "score_sum": 0.0,
+        "weight_sum": 0.0,
+        "weighted_score_sum": 0.0,
+        "labels": {k: 0 for k in sentiment_engine.SENTIMENT_LABELS},
+    }
+
+
+def merge_aggregates(*aggs):
+    out = empty_aggregate()
+    for agg in aggs:
+        for k in ("count", "score_sum", "weight_sum", "weighted_score_sum"):
+            out[k] += agg[k]
+        for k, n in agg["labels"].items():
+            out["labels"][k] = out["labels"].get(k, 0) + n
+    return out
+
+
+def average_score(agg):
+    return agg["score_sum"] / agg["count"] if agg["count"] else 0.0
+
+
+def timeline_buckets(df, freq):
+    # Per-bucket sums (comments, score_sum, one column per label) indexed by
+    # bucket start. Sums are additive, so buckets for newly fetched comments
+    # can be merged onto cached ones with merge_timelines.
+    frame = pd.DataFrame(
+        {
+            "published_at": df["published_at"],
+            "comments": np.ones(len(df), dtype="int64"),
+            "score_sum": df["sentiment_score"].astype("float64"),
+            **{k: (df["sentiment"] == k).astype("int64") for k in sentiment_engine.SENTIMENT_LABELS},
+        }
+    ).dropna(subset=["published_at"])
+    return frame.groupby(pd.Grouper(key="published_at", freq=freq, closed="left", label="left")).sum()
+
+
+def merge_timelines(freq, *timelines):
+    timelines = [t for t in timelines if t is not None and len(t)]
+    if not timelines:
+        return None
+    out = timelines[0] if len(timelines) == 1 else pd.concat(timelines).groupby(level=0).sum()
+    return out.reindex(pd.date_range(out.index.min(), out.index.max(), freq=freq), fill_value=0)
+
+
+def rolling_timeline(buckets, window=1):
+    # Rolling means over `window` buckets. Sentiment and label shares are
+    # comment-weighted (rolling sums divided), so quiet buckets count less.
+    sums = buckets.rolling(window, min_periods=1).sum()
+    comments = sums["comments"].where(sums["comments"] > 0)
+    out = pd.DataFrame(
+        {
+            "Comments": buckets["comments"],
+            "Rolling Comments": buckets["comments"].rolling(window, min_periods=1).mean(),
+            "Avg Sentiment": sums["score_sum"] / comments,
+        }
+    )
+    for k in sentiment_engine.SENTIMENT_LABELS:
+        out[f"{k} %"] = sums[k] / comments * 100
+    return out
+
+
+def comparison_row(title, agg):
+    n = agg["count"] or 1
+    return {
+        "Video": title[:55],
+        "Total Comments": agg["count"],
+        "Positive %": agg["labels"]["Positive"] / n * 100,
+        "Neutral %": agg["labels"]["Neutral"] / n * 100,
+        "Negative %": agg["labels"]["Negative"] / n * 100,
+        "Avg Sentiment": average_score(agg),
+        "Like-weighted Sentiment": agg["weighted_score_sum"] / agg["weight_sum"] if agg["weight_sum"] else 0.0,
+    }
+
+
+def collection_row(title, aggs):
+    # Channel or playlist totals over its videos' aggregates
+    # ({video_id: (title, agg)}); keyed by ID as episodes often share titles.
+    aggs = {vid: (t, a) for vid, (t, a) in aggs.items() if a and a["count"]}
+    total = merge_aggregates(*(a for _, a in aggs.values()))
+    row = {"Channel / Playlist": title[:55], "Videos": len(aggs)}
+    row.update((k, v) for k, v in comparison_row(title, total).items() if k != "Video")
+    row["Comments per Video"] = total["count"] / len(aggs) if aggs else 0.0
+    averages = {vid: average_score(a) for vid, (_, a) in aggs.items()}
+    row["Most Positive Video"] = aggs[max(averages, key=averages.get)][0][:55] if averages else ""
+    row["Most Negative Video"] = aggs[min(averages, key=averages.get)][0][:55] if averages else ""
+    return row
+
+
+def summary_row(video_id, title, df, generated_at=None):
+    counts = df["sentiment"].value_counts()
+    return {
+        "Video Title": title,
+        "Video ID": video_id,
+        "Total Comments": len(df),
+        "Avg Sentiment": df["sentiment_score"].mean(),
+        "Positive %": (df["sentiment"] == "Positive").mean() * 100,
+        "Neutral %": (df["sentiment"] == "Neutral").mean() * 100,
+        "Negative %": (df["sentiment"] == "Negative").mean() * 100,
+        "Positive Count": int(counts.get("Positive", 0)),
+        "Neutral Count": int(counts.get("Neutral", 0)),
+        "Negative Count": int(counts.get("Negative", 0)),
+        "Generated At": generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def detailed_chunks(video_id, title, df, generated_at=None, chunk_rows=50000):
+    # The detailed export a slice at a time; only the slice being written is
+    # copied to add the video columns.
+    generated_at = generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].assign(
+            video_id=video_id,
+            video_title=title,
+            analysis_timestamp=generated_at,
+        )
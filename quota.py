@@ -0,0 +1,262 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+
+    QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:
+    QUOTA_TZ = timezone.utc
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only threads of one process are serialized.
+    fcntl = None
+
+import comment_store
+
+# Quota-aware scheduler for YouTube Data API calls. Every request is charged
+# its unit cost against a daily budget kept in a small JSON file next to the
+# comment store (YouTube resets quota at midnight Pacific time), paced by a
+# token bucket, and retried with jittered exponential backoff on transient
+# errors. A request is retried as-is, so pagination resumes from the same
+# pageToken instead of dropping the rest of the comments.
+
+DAILY_QUOTA = int(os.environ.get("YOUTUBE_DAILY_QUOTA", "10000"))
+QUOTA_FILE = os.environ.get("YOUTUBE_QUOTA_FILE") or os.path.join(comment_store.STORE_DIR, "quota.json")
+REQUESTS_PER_SECOND = float(os.environ.get("YOUTUBE_REQUESTS_PER_SECOND", "10"))
+MAX_RETRIES = int(os.environ.get("YOUTUBE_MAX_RETRIES", "5"))
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+
+# Unit costs per method; anything not listed is a 1-unit read.
+UNIT_COSTS = {
+    "youtube.search.list": 100,
+}
+DEFAULT_COST = 1
+PAGE_SIZE = 100
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "backendError", "internalError")
+
+
+class QuotaError(Exception):
+    pass
+
+
+def quota_day():
+    return datetime.now(QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+def request_cost(request):
+    return UNIT_COSTS.get(getattr(request, "methodId", None), DEFAULT_COST)
+
+
+def estimate_units(max_comments, videos=1):
+    # videos.list plus one commentThreads page per 100 comments; reply
+    # threads add an unknown number of comments.list calls on top.
+    return videos * (1 + max(1, math.ceil(max_comments / PAGE_SIZE)))
+
+
+class QuotaLedger:
+    # The file is shared by every process using the same store (the
+    # dashboard and cron CLI runs), so each read or charge re-reads it while
+    # holding an exclusive lock on a sidecar lock file, and a charge adds its
+    # units to what the file says rather than writing a process-local total.
+
+    def __init__(self, path=QUOTA_FILE, budget=DAILY_QUOTA):
+        self.path = path
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._day = None
+        self._used = 0
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            lock = None
+            if fcntl is not None:
+                try:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    lock = open(f"{self.path}.lock", "a")
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                except OSError:
+                    if lock is not None:
+                        lock.close()
+                    lock = None
+            try:
+                self._load()
+                yield
+            finally:
+                if lock is not None:
+                    lock.close()
+
+    def _load(self):
+        # An unreadable file keeps this process's own count for today.
+        day = quota_day()
+        if self._day != day:
+            self._day, self._used = day, 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            self._used = 0
+        except (OSError, ValueError):
+            pass
+        else:
+            self._used = int(saved.get("used", 0)) if saved.get("day") == day else 0
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"day": self._day, "used": self._used, "budget": self.budget}, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def used(self):
+        with self._locked():
+            return self._used
+
+    def remaining(self):
+        with self._locked():
+            return max(0, self.budget - self._used)
+
+    def can_afford(self, units):
+        return units <= self.remaining()
+
+    def charge(self, units):
+        with self._locked():
+            if self._used + units > self.budget:
+                raise QuotaError(
+                    f"Daily API quota budget reached ({self._used:,} of {self.budget:,} units used). "
+                    "Try again after midnight Pacific time."
+                )
+            self._used += units
+            self._save()
+
+    def exhaust(self):
+        # The API itself said quotaExceeded: stop sending requests today.
+        with self._locked():
+            self._used = max(self._used, self.budget)
+            self._save()
+
+
+class TokenBucket:
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        # Takes a token if one is available (-> 0), else returns the seconds
+        # until one will be; async callers sleep on that themselves.
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+def error_status(e):
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "resp", None), "status", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(e):
+    if isinstance(e, QuotaError):
+        return False
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    msg = str(e)
+    if "quotaExceeded" in msg:
+        return False
+    return error_status(e) in RETRYABLE_STATUS or any(r in msg for r in RETRYABLE_REASONS)
+
+
+def backoff_delay(attempt):
+    # Full jitter: uniform in [0, base * 2^attempt], capped.
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+class Scheduler:
+    def __init__(self, ledger=None, bucket=None, max_retries=MAX_RETRIES, sleep=time.sleep):
+        self.ledger = ledger or QuotaLedger()
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.stats = {"requests": 0, "retries": 0, "units": 0}
+        self._lock = threading.Lock()
+
+    def admit(self, cost):
+        self.ledger.charge(cost)
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["units"] += cost
+
+    def should_retry(self, e, attempt):
+        # Called with a failed request's error; True means back off and retry.
+        if "quotaExceeded" in str(e):
+            self.ledger.exhaust()
+        if attempt >= self.max_retries or not is_retryable(e):
+            return False
+        with self._lock:
+            self.stats["retries"] += 1
+        return True
+
+    def execute(self, request):
+        cost = request_cost(request)
+        attempt = 0
+        while True:
+            self.admit(cost)
+            self.bucket.acquire()
+            try:
+                return request.execute()
+            except Exception as e:
+                if not self.should_retry(e, attempt):
+                    raise
+            self.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def check(self, units):
+        remaining = self.ledger.remaining()
+        if units > remaining:
+            raise QuotaError(
+                f"This needs about {units:,} API units but only {remaining:,} of today's "
+                f"{self.ledger.budget:,} remain. Lower the comment limit or try again after midnight Pacific time."
+            )
+
+
+SCHEDULER = Scheduler()
+
+
+def execute(request):
+    return SCHEDULER.execute(request)
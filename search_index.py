@@ -0,0 +1,219 @@
+import bisect
+import html
+import re
+import threading
+
+import numpy as np
+
+# Inverted index for keyword, phrase and prefix search over comments.
+#
+# Each add() tokenizes only the new comments into one segment: term ids,
+# document ids and token positions sorted by term, so a term's postings are a
+# contiguous slice found with searchsorted. A new segment is merged into the
+# one before it while that one is less than MERGE_FACTOR times larger, so a
+# video fetched page by page ends up with a handful of segments and each
+# posting is re-sorted only a logarithmic number of times. Documents are
+# numbered in the order they were added and map back to comment IDs through
+# doc_ids; segments stay in document order, so concatenated postings are
+# already sorted by document.
+#
+# Query syntax: whitespace-separated terms must all match (AND), "OR" between
+# groups of terms matches either side, "quoted words" match as a phrase and
+# a trailing * matches by prefix, e.g.  great OR love  "not good"  amaz*
+
+TOKEN = re.compile(r"\w+")
+QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+MERGE_FACTOR = 4
+POSITION_BITS = 32
+
+
+def tokenize(text):
+    return TOKEN.findall(str(text).lower())
+
+
+class QueryError(ValueError):
+    pass
+
+
+def parse_query(query):
+    # -> list of OR clauses, each a list of atoms ("term" | "prefix" | "phrase", value)
+    clauses, atoms = [], []
+    for m in QUERY_TOKEN.finditer(query or ""):
+        phrase, word = m.groups()
+        if word == "OR":
+            if atoms:
+                clauses.append(atoms)
+            atoms = []
+            continue
+        if word == "AND":
+            continue
+        if phrase is not None:
+            words = tokenize(phrase)
+            if len(words) == 1:
+                atoms.append(("term", words[0]))
+            elif words:
+                atoms.append(("phrase", tuple(words)))
+        elif word.endswith("*") and len(word) > 1:
+            stem = tokenize(word[:-1])
+            if len(stem) != 1:
+                raise QueryError(f"Prefix search needs a single word before *: {word}")
+            atoms.append(("prefix", stem[0]))
+        else:
+            atoms.extend(("term", w) for w in tokenize(word))
+    if atoms:
+        clauses.append(atoms)
+    return clauses
+
+
+def highlight_pattern(clauses):
+    words, prefixes = set(), set()
+    for atoms in clauses:
+        for kind, value in atoms:
+            if kind == "term":
+                words.add(value)
+            elif kind == "prefix":
+                prefixes.add(value)
+            else:
+                words.update(value)
+    parts = [re.escape(w) + r"\b" for w in sorted(words, key=len, reverse=True)]
+    parts += [re.escape(p) + r"\w*" for p in sorted(prefixes, key=len, reverse=True)]
+    if not parts:
+        return None
+    return re.compile(r"\b(?:" + "|".join(parts) + ")", re.IGNORECASE)
+
+
+def highlight(text, pattern, tag="mark"):
+    # HTML-escaped text with every match wrapped in <mark>.
+    text = str(text)
+    if pattern is None:
+        return html.escape(text)
+    out, last = [], 0
+    for m in pattern.finditer(text):
+        out.append(html.escape(text[last:m.start()]))
+        out.append(f"<{tag}>{html.escape(m.group(0))}</{tag}>")
+        last = m.end()
+    out.append(html.escape(text[last:]))
+    return "".join(out)
+
+
+class SearchIndex:
+    def __init__(self):
+        self.vocab = {}
+        self.doc_ids = []
+        self.known = set()
+        self.segments = []
+        self._sorted_vocab = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add(self, comment_ids, texts):
+        # Indexes comments whose IDs have not been seen; returns how many.
+        terms, docs, positions = [], [], []
+        added = 0
+        with self._lock:
+            for cid, text in zip(comment_ids, texts):
+                if cid in self.known:
+                    continue
+                self.known.add(cid)
+                added += 1
+                doc = len(self.doc_ids)
+                self.doc_ids.append(cid)
+                for pos, word in enumerate(tokenize(text)):
+                    tid = self.vocab.get(word)
+                    if tid is None:
+                        tid = self.vocab[word] = len(self.vocab)
+                        self._sorted_vocab = None
+                    terms.append(tid)
+                    docs.append(doc)
+                    positions.append(pos)
+            if terms:
+                self.segments.append(
+                    self._segment(
+                        np.asarray(terms, dtype=np.int32),
+                        np.asarray(docs, dtype=np.int32),
+                        np.asarray(positions, dtype=np.int32),
+                    )
+                )
+                while len(self.segments) > 1 and len(self.segments[-2][0]) < MERGE_FACTOR * len(self.segments[-1][0]):
+                    tail = self.segments[-2:]
+                    self.segments[-2:] = [self._segment(*(np.concatenate(a) for a in zip(*tail)))]
+        return added
+
+    @staticmethod
+    def _segment(terms, docs, positions):
+        order = np.lexsort((positions, docs, terms))
+        return terms[order], docs[order], positions[order]
+
+    def _postings(self, tid):
+        docs, positions = [], []
+        for terms, d, p in self.segments:
+            lo, hi = np.searchsorted(terms, [tid, tid + 1])
+            docs.append(d[lo:hi])
+            positions.append(p[lo:hi])
+        if not docs:
+            return np.empty(0, np.int32), np.empty(0, np.int32)
+        return np.concatenate(docs), np.concatenate(positions)
+
+    @staticmethod
+    def _distinct(docs):
+        # docs is sorted; drop repeats from words occurring twice in a comment.
+        if len(docs) < 2:
+            return docs
+        return docs[np.concatenate(([True], docs[1:] != docs[:-1]))]
+
+    def _term_docs(self, word):
+        tid = self.vocab.get(word)
+        if tid is None:
+            return np.empty(0, np.int32)
+        return self._distinct(self._postings(tid)[0])
+
+    def _prefix_docs(self, stem):
+        if self._sorted_vocab is None:
+            self._sorted_vocab = sorted(self.vocab)
+        words = self._sorted_vocab
+        lo = bisect.bisect_left(words, stem)
+        hi = bisect.bisect_left(words, stem + "\U0010ffff")
+        if lo == hi:
+            return np.empty(0, np.int32)
+        return np.unique(np.concatenate([self._postings(self.vocab[w])[0] for w in words[lo:hi]]))
+
+    def _phrase_docs(self, words):
+        # (doc, position - offset) pairs must line up for every word.
+        starts = None
+        for offset, word in enumerate(words):
+            tid = self.vocab.get(word)
+            if tid is None:
+                return np.empty(0, np.int32)
+            d, p = self._postings(tid)
+            keys = (d.astype(np.int64) << POSITION_BITS) + (p.astype(np.int64) - offset)
+            starts = keys if starts is None else np.intersect1d(starts, keys, assume_unique=True)
+            if not len(starts):
+                return np.empty(0, np.int32)
+        return np.unique(starts >> POSITION_BITS).astype(np.int32)
+
+    def search_docs(self, clauses):
+        with self._lock:
+            result = None
+            for atoms in clauses:
+                docs = None
+                for kind, value in atoms:
+                    if kind == "term":
+                        hit = self._term_docs(value)
+                    elif kind == "prefix":
+                        hit = self._prefix_docs(value)
+                    else:
+                        hit = self._phrase_docs(value)
+                    docs = hit if docs is None else np.intersect1d(docs, hit, assume_unique=True)
+                    if not len(docs):
+                        break
+                if docs is not None:
+                    result = docs if result is None else np.union1d(result, docs)
+            return result if result is not None else np.empty(0, np.int32)
+
+    def search(self, clauses):
+        # -> array of matching comment IDs
+        docs = self.search_docs(clauses)
+        ids = np.asarray(self.doc_ids, dtype=object)
+        return ids[docs] if len(docs) else ids[:0]
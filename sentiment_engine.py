@@ -0,0 +1,397 @@
+import atexit
+import itertools
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Batch re-implementation of TextBlob's PatternAnalyzer polarity
+# (textblob.en.sentiment called on a plain string). Scores match
+# TextBlob(text).sentiment.polarity exactly; the lexicon is read once and
+# every comment in a Series is scored in one pass. textblob itself is only
+# imported the first time a lexicon or a non-trivial tokenization is needed.
+
+POSITIVE_THRESHOLD = 0.1
+NEGATIVE_THRESHOLD = -0.1
+SENTIMENT_LABELS = ["Positive", "Neutral", "Negative"]
+
+# Comments without punctuation, quotes or symbols tokenize to a plain
+# whitespace split, so they skip the pattern tokenizer entirely.
+PLAIN_TEXT = r"[^\w\s]|_"
+BATCH_SEPARATOR = "\x00"
+TOKEN_CACHE_SIZE = 200_000
+
+_TEXTBLOB_LOADED = False
+_TOKEN_CACHE = {}
+_LEXICON = None
+
+# Parallel scoring is only worth the IPC cost on large comment sets.
+PARALLEL_MIN_COMMENTS = 20_000
+PARALLEL_CHUNK_SIZE = 5_000
+
+_POOL = None
+_POOL_WORKERS = 0
+
+
+def _load_textblob():
+    global _TEXTBLOB_LOADED, _PUNCT, _TERMINATORS, _CLOSERS
+    global ABBREVIATIONS, EMOTICONS, EOS, PUNCTUATION, RE_ABBR1, RE_ABBR2, RE_ABBR3, RE_EMOTICONS, RE_SARCASM
+    global replacements, pattern_sentiment
+    if _TEXTBLOB_LOADED:
+        return
+
+    from textblob._text import (
+        ABBREVIATIONS,
+        EMOTICONS,
+        EOS,
+        PUNCTUATION,
+        RE_ABBR1,
+        RE_ABBR2,
+        RE_ABBR3,
+        RE_EMOTICONS,
+        RE_SARCASM,
+        replacements,
+    )
+    from textblob.en import sentiment as pattern_sentiment
+
+    _PUNCT = tuple(PUNCTUATION.replace(".", ""))
+    _TERMINATORS = ("...", ".", "!", "?", EOS)
+    _CLOSERS = ("'", '"', "\u201d", "\u2019", "...", ".", "!", "?", ")", EOS)
+    _TEXTBLOB_LOADED = True
+
+
+def lexicon():
+    global _LEXICON
+    if _LEXICON is not None:
+        return _LEXICON
+
+    _load_textblob()
+    if dict.__len__(pattern_sentiment) == 0:
+        pattern_sentiment.load()
+
+    words = list(dict.keys(pattern_sentiment))
+    polarity = np.empty(len(words), dtype=float)
+    intensity = np.empty(len(words), dtype=float)
+    modifier = np.zeros(len(words), dtype=bool)
+    for k, w in enumerate(words):
+        pos = dict.__getitem__(pattern_sentiment, w)
+        p, s, i = pos[None]
+        polarity[k] = p
+        intensity[k] = i
+        modifier[k] = any(m in pos for m in pattern_sentiment.modifiers)
+
+    emoticons = {}
+    for (_, p), faces in EMOTICONS.items():
+        for e in faces:
+            e = e.lower()
+            if e.isalpha() is False and len(e) <= 5 and e not in PUNCTUATION:
+                emoticons.setdefault(e, p)
+
+    _LEXICON = {
+        "words": pd.Index(words),
+        "polarity": polarity,
+        "intensity": intensity,
+        "modifier": modifier,
+        "emoticons": pd.Index(list(emoticons)),
+        "emoticon_polarity": np.array(list(emoticons.values()), dtype=float),
+        "negations": list(pattern_sentiment.negations),
+    }
+    return _LEXICON
+
+
+def _split_token(t):
+    # Leading/trailing punctuation split of one whitespace token, as in
+    # pattern's find_tokens(); pure function of the token so it is memoized.
+    cached = _TOKEN_CACHE.get(t)
+    if cached is not None:
+        return cached
+
+    word = t
+    tokens = []
+    tail = []
+    while t.startswith(_PUNCT) and t not in replacements:
+        tokens.append(t[0])
+        t = t[1:]
+    while t.endswith(_PUNCT + (".",)) and t not in replacements:
+        if t.endswith(_PUNCT):
+            tail.append(t[-1])
+            t = t[:-1]
+        if t.endswith("..."):
+            tail.append("...")
+            t = t[:-3].rstrip(".")
+        if t.endswith("."):
+            if (
+                t in ABBREVIATIONS
+                or RE_ABBR1.match(t) is not None
+                or RE_ABBR2.match(t) is not None
+                or RE_ABBR3.match(t) is not None
+            ):
+                break
+            tail.append(t[-1])
+            t = t[:-1]
+    if t != "":
+        tokens.append(t)
+    tokens.extend(reversed(tail))
+
+    if len(_TOKEN_CACHE) >= TOKEN_CACHE_SIZE:
+        _TOKEN_CACHE.clear()
+    _TOKEN_CACHE[word] = tokens
+    return tokens
+
+
+def _sentences(tokens):
+    sentences, i, j = [[]], 0, 0
+    while j < len(tokens):
+        if tokens[j] in _TERMINATORS:
+            while j < len(tokens) and tokens[j] in _CLOSERS:
+                if tokens[j] in ("'", '"') and sentences[-1].count(tokens[j]) % 2 == 0:
+                    break
+                j += 1
+            sentences[-1].extend(t for t in tokens[i:j] if t != EOS)
+            sentences.append([])
+            i = j
+        j += 1
+    sentences[-1].extend(tokens[i:j])
+
+    words = []
+    for s in sentences:
+        if not s:
+            continue
+        s = " ".join(s)
+        if "!" in s:
+            s = RE_SARCASM.sub("(!)", s)
+        s = RE_EMOTICONS.sub(_merge_emoticon, s)
+        words.extend(s.lower().split())
+    return words
+
+
+def _merge_emoticon(m):
+    return m.group(1).replace(" ", "") + m.group(2)
+
+
+def _rough_tokens(texts):
+    # The whitespace, contraction and quote rewrites of find_tokens() are
+    # local, so they run once over the whole batch joined by a separator.
+    _load_textblob()
+    joined = BATCH_SEPARATOR.join(texts)
+    for a, b in list(replacements.items()):
+        joined = re.sub(a, b, joined)
+    for q in ("\u201c", "\u201d", "\u2018", "\u2019", "'", '"'):
+        joined = joined.replace(q, " %s " % q)
+    joined = re.sub("\r\n", "\n", joined)
+    joined = re.sub(r"\n{2,}", " %s " % EOS, joined)
+    joined = re.sub(r"\s+", " ", joined)
+
+    docs = joined.split(BATCH_SEPARATOR)
+    if len(docs) != len(texts):
+        return [
+            [w.lower() for w in " ".join(pattern_sentiment.tokenizer(t)).split()]
+            for t in texts
+        ]
+
+    out = []
+    for doc in docs:
+        tokens = []
+        for t in doc.split():
+            tokens.extend(_split_token(t))
+        out.append(_sentences(tokens))
+    return out
+
+
+def tokenize(texts):
+    texts = pd.Series([str(t) for t in texts], dtype=object)
+    plain = ~texts.str.contains(PLAIN_TEXT, regex=True).to_numpy(dtype=bool)
+
+    tokens = np.empty(len(texts), dtype=object)
+    tokens[plain] = texts[plain].str.lower().str.split().to_numpy()
+    for k, words in zip(np.flatnonzero(~plain), _rough_tokens(texts[~plain].tolist())):
+        tokens[k] = words
+    return tokens
+
+
+def _assess(known, p, i, mod, neg, ly, long1, long2, bang, sarc, emo, emo_p):
+    # Exact replay of pattern's Sentiment.assessments() over pre-mapped token
+    # arrays, for comments where intensifiers, negations or "!" interact.
+    a = []
+    m = False
+    m_ly = False
+    n = False
+    for k in range(len(known)):
+        if known[k]:
+            if not m:
+                a.append([p[k], i[k], 1])
+            else:
+                last = a[-1]
+                last[0] = max(-1.0, min(p[k] * last[1], +1.0))
+                last[1] = i[k]
+            if n:
+                a[-1][1] = 1.0 / a[-1][1]
+                a[-1][2] = -1
+            m = mod[k]
+            m_ly = ly[k]
+            n = neg[k]
+        else:
+            if neg[k]:
+                n = True
+            elif n and long1[k]:
+                n = False
+            if n and m and m_ly:
+                a[-1][2] = -1
+                n = False
+            elif m and long2[k]:
+                m = False
+            if bang[k] and a:
+                a[-1][0] = max(-1.0, min(a[-1][0] * 1.25, +1.0))
+            if sarc[k]:
+                a.append([0.0, 1.0, 1])
+            if emo[k]:
+                a.append([emo_p[k], 1.0, 1])
+
+    s = 0
+    for score, _, negated in a:
+        s += score * -0.5 if negated < 0 else score
+    return s / float(len(a) or 1)
+
+
+def polarity(texts):
+    texts = pd.Series(texts, dtype=object)
+    if texts.empty:
+        return pd.Series([], index=texts.index, dtype=float)
+
+    codes, uniques = pd.factorize(pd.Series([str(t) for t in texts], dtype=object))
+    tokens = tokenize(uniques)
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    owner = np.repeat(np.arange(len(tokens)), lengths)
+    flat = pd.Series(list(itertools.chain.from_iterable(tokens)), dtype=object)
+
+    # Token features are looked up once per distinct token and broadcast.
+    lex = lexicon()
+    tok_codes, vocab = pd.factorize(flat)
+    vocab = pd.Series(vocab, dtype=object)
+    idx = lex["words"].get_indexer(vocab)[tok_codes]
+    known = idx >= 0
+    p = np.where(known, lex["polarity"][idx], 0.0)
+    i = np.where(known, lex["intensity"][idx], 1.0)
+    mod = known & lex["modifier"][idx]
+    neg = vocab.isin(lex["negations"]).to_numpy()[tok_codes]
+    bang = (vocab == "!").to_numpy()[tok_codes]
+    sarc = (vocab == "(!)").to_numpy()[tok_codes]
+    emo_idx = lex["emoticons"].get_indexer(vocab)[tok_codes]
+    emo = ~known & (emo_idx >= 0)
+    emo_p = np.where(emo, lex["emoticon_polarity"][emo_idx], 0.0)
+
+    # Comments with no negation, "!" and no modifier in front of another
+    # token are a plain mean over their assessed tokens.
+    followed = np.ones(len(tok_codes), dtype=bool)
+    ends = np.cumsum(lengths) - 1
+    followed[ends[lengths > 0]] = False
+    context = neg | bang | (mod & followed)
+    contextual = np.zeros(len(tokens), dtype=bool)
+    contextual[owner[context]] = True
+
+    assessed = known | sarc | emo
+    values = np.where(known, p, emo_p)
+    sums = np.zeros(len(tokens), dtype=float)
+    counts = np.bincount(owner[assessed], minlength=len(tokens))
+    pos = np.flatnonzero(assessed)
+    if len(pos):
+        # Add the j-th assessed token of every comment in step j, so each
+        # sum is accumulated left to right exactly like pattern's avg().
+        groups = owner[pos]
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        rank = np.arange(len(pos)) - np.repeat(starts, np.diff(np.r_[starts, len(pos)]))
+        order = np.argsort(rank, kind="stable")
+        bounds = np.r_[0, np.cumsum(np.bincount(rank))]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            step = order[lo:hi]
+            sums[groups[step]] += values[pos[step]]
+    scores = sums / np.maximum(counts, 1)
+
+    if contextual.any():
+        ly = vocab.str.endswith("ly").to_numpy(dtype=bool)[tok_codes]
+        long1 = (vocab.str.strip("'").str.len() > 1).to_numpy()[tok_codes]
+        long2 = (vocab.str.len() > 2).to_numpy()[tok_codes]
+        offsets = np.r_[0, np.cumsum(lengths)]
+        arrays = (known, p, i, mod, neg, ly, long1, long2, bang, sarc, emo, emo_p)
+        lists = [a.tolist() for a in arrays]
+        for u in np.flatnonzero(contextual):
+            lo, hi = offsets[u], offsets[u + 1]
+            scores[u] = _assess(*(a[lo:hi] for a in lists))
+
+    return pd.Series(scores[codes], index=texts.index, dtype=float)
+
+
+def labels(scores):
+    scores = np.asarray(scores, dtype=float)
+    return np.select(
+        [scores > POSITIVE_THRESHOLD, scores < NEGATIVE_THRESHOLD],
+        ["Positive", "Negative"],
+        default="Neutral",
+    )
+
+
+def _warm_worker():
+    lexicon()
+
+
+def _score_chunk(texts):
+    return polarity(pd.Series(texts, dtype=object)).to_numpy()
+
+
+def shutdown_pool():
+    global _POOL, _POOL_WORKERS
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+    _POOL = None
+    _POOL_WORKERS = 0
+
+
+def scoring_pool(workers):
+    # One pool per process, reused across calls and sessions; it is only
+    # rebuilt when the requested worker count changes.
+    global _POOL, _POOL_WORKERS
+    if _POOL is None or _POOL_WORKERS != workers:
+        shutdown_pool()
+        _POOL = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        _POOL_WORKERS = workers
+    return _POOL
+
+
+def polarity_parallel(
+    texts,
+    workers=None,
+    chunk_size=PARALLEL_CHUNK_SIZE,
+    min_size=PARALLEL_MIN_COMMENTS,
+):
+    texts = pd.Series(texts, dtype=object)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1 or len(texts) < max(min_size, 1):
+        return polarity(texts)
+
+    # Duplicates are collapsed before chunking so each distinct comment is
+    # scored once; chunks come back in submission order from map().
+    codes, uniques = pd.factorize(pd.Series([str(t) for t in texts], dtype=object))
+    uniques = list(uniques)
+    chunk_size = max(int(chunk_size), 1)
+    chunks = [uniques[k:k + chunk_size] for k in range(0, len(uniques), chunk_size)]
+    if len(chunks) < 2:
+        return polarity(texts)
+
+    try:
+        parts = list(scoring_pool(workers).map(_score_chunk, chunks))
+    except Exception:
+        shutdown_pool()
+        return polarity(texts)
+
+    scores = np.concatenate(parts)
+    return pd.Series(scores[codes], index=texts.index, dtype=float)
+
+
+atexit.register(shutdown_pool)
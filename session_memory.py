@@ -0,0 +1,121 @@
+import os
+import shutil
+import threading
+import time
+
+import comment_store
+
+# Per-session memory limits. Video frames a session has not looked at
+# recently are spilled to compact Parquet files under SPILL_DIR/<session>
+# and read back when a tab needs them. The registry remembers when each
+# session last ran and, from a background reaper thread, releases the data
+# and spill files of sessions idle for longer than the session timeout,
+# whether or not they ever come back to log out.
+
+MEMORY_BUDGET = int(float(os.environ.get("SESSION_MEMORY_MB", "512")) * 1e6)
+SPILL_DIR = os.environ.get("SESSION_SPILL_DIR") or os.path.join(comment_store.STORE_DIR, "spill")
+REAP_INTERVAL_SECONDS = 60
+
+
+def spill_dir(session_id):
+    return os.path.join(SPILL_DIR, session_id)
+
+
+def spill_path(session_id, video_id):
+    return os.path.join(spill_dir(session_id), f"{video_id}.parquet")
+
+
+def spill_frame(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path, compression="zstd", index=False)
+    return os.path.getsize(path)
+
+
+def load_frame(path):
+    import pandas as pd
+
+    return pd.read_parquet(path)
+
+
+def remove_spill(session_id, video_id=None):
+    if video_id is None:
+        shutil.rmtree(spill_dir(session_id), ignore_errors=True)
+        return
+    try:
+        os.remove(spill_path(session_id, video_id))
+    except OSError:
+        pass
+
+
+class SessionRegistry:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.timeout = None
+        self.reaped = 0
+        self._sessions = {}  # session_id -> (last_seen, resources)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def touch(self, session_id, **resources):
+        # resources: containers to clear (dicts, lists) or objects with discard()
+        # holding this session's memory. Re-registered on every rerun so a
+        # container replaced by the session is not kept alive here.
+        with self._lock:
+            self._sessions[session_id] = (self.clock(), resources)
+
+    def forget(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def reap(self, timeout=None):
+        timeout = timeout or self.timeout
+        cutoff = self.clock() - timeout
+        with self._lock:
+            idle = [sid for sid, (seen, _) in self._sessions.items() if seen < cutoff]
+            released = [(sid, self._sessions.pop(sid)[1]) for sid in idle]
+        for sid, resources in released:
+            for res in resources.values():
+                if hasattr(res, "discard"):
+                    res.discard()
+                elif hasattr(res, "clear"):
+                    res.clear()
+            remove_spill(sid)
+        self.reaped += len(released)
+        return idle
+
+    def remove_orphans(self, timeout=None):
+        # Spill directories left by sessions of an earlier process.
+        cutoff = self.clock() - (timeout or self.timeout)
+        try:
+            names = os.listdir(SPILL_DIR)
+        except OSError:
+            return
+        with self._lock:
+            live = set(self._sessions)
+        for name in names:
+            path = os.path.join(SPILL_DIR, name)
+            if name not in live and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def start(self, timeout, interval=REAP_INTERVAL_SECONDS):
+        with self._lock:
+            self.timeout = timeout
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self.remove_orphans()
+        self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.reap()
+            except Exception:
+                pass
+
+
+REGISTRY = SessionRegistry()
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Process-wide cache of fetched and scored video data shared by every
+# session on the server. Entries expire after a TTL and the least recently
+# used ones are evicted once their combined size passes a byte budget.
+# load() is single-flight: while one caller runs the loader for a key, other
+# callers for the same key wait for its result instead of fetching again.
+# Values are handed out by reference, so sessions must treat them as
+# read-only.
+
+TTL_SECONDS = float(os.environ.get("SHARED_CACHE_TTL_SECONDS", "900"))
+MAX_BYTES = int(float(os.environ.get("SHARED_CACHE_MAX_MB", "1024")) * 1e6)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SharedCache:
+    def __init__(self, ttl=TTL_SECONDS, max_bytes=MAX_BYTES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "waits": 0, "loads": 0, "evictions": 0, "expired": 0}
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def _lookup(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        if self.ttl > 0 and self.clock() - item[2] > self.ttl:
+            self._drop(key)
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return item
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            item = self._lookup(key)
+            self.stats["hits" if item else "misses"] += 1
+            return item[0] if item else None
+
+    def put(self, key, value, size=0):
+        with self._lock:
+            self._store(key, value, size)
+        return value
+
+    def _store(self, key, value, size):
+        if key in self._entries:
+            self._drop(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, self.clock())
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def load(self, key, loader, sizeof=None, refresh=False):
+        # Returns the cached value, or runs loader() once across all callers.
+        # refresh skips the cached value but still joins a load in flight.
+        # A None result is returned but not cached; loader errors reach every
+        # waiting caller.
+        with self._lock:
+            if not refresh:
+                item = self._lookup(key)
+                if item is not None:
+                    self.stats["hits"] += 1
+                    return item[0]
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["waits"] += 1
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self.stats["loads"] += 1
+                if flight.error is None and flight.value is not None:
+                    self._store(key, flight.value, sizeof(flight.value) if sizeof else 0)
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def summary(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self.bytes, "in_flight": len(self._flights)}
+
+
+VIDEOS = SharedCache()
@@ -0,0 +1,68 @@
+import numpy as np
+
+import dedupe
+
+SPAM = "Check out my channel for free giveaways every single day, subscribe now"
+
+
+def groups(texts):
+    return list(dedupe.duplicate_groups(texts))
+
+
+def test_groups_are_numbered_by_first_appearance():
+    g = dedupe.duplicate_groups(["b", "a", "b", "c", "a"])
+    assert g.dtype == np.int32
+    assert list(g) == [0, 1, 0, 2, 1]
+    assert len(dedupe.duplicate_groups([])) == 0
+
+
+def test_exact_duplicates_after_normalizing():
+    g = groups(
+        [
+            "Great video!!",
+            "great   video",
+            "GREAT VIDEO https://spam.example/x",
+            "great video, really",
+        ]
+    )
+    assert g[0] == g[1] == g[2]
+    assert g[3] != g[0]
+
+
+def test_emoji_only_comments_match_exactly():
+    g = groups(["\U0001f525\U0001f525", "\U0001f525\U0001f525", "\U0001f602", " \U0001f525\U0001f525 "])
+    assert g[0] == g[1] == g[3]
+    assert g[2] != g[0]
+
+
+def test_near_duplicates_join_one_group():
+    texts = [
+        SPAM,
+        SPAM + "!!!",
+        SPAM.replace("every single day", "every single day ok"),
+        "The bridge at 3:12 is the best part of the whole song honestly",
+    ]
+    g = groups(texts)
+    assert g[0] == g[1] == g[2]
+    assert g[3] != g[0]
+
+
+def test_short_comments_only_match_exactly():
+    # Below NEAR_MIN_CHARS one word changes too much of the text to estimate.
+    assert len("nice beautiful really") < dedupe.NEAR_MIN_CHARS
+    g = groups(["nice beautiful really", "worst beautiful really", "nice beautiful really"])
+    assert g == [0, 1, 0]
+
+
+def test_threshold():
+    # A reworded ending shares most shingles but not 80% of them.
+    texts = [SPAM, SPAM.replace("subscribe now", "like and subscribe")]
+    assert dedupe.duplicate_groups(texts, threshold=0.8).tolist() == [0, 1]
+    assert dedupe.duplicate_groups(texts, threshold=0.5).tolist() == [0, 0]
+
+
+def test_score_keys_collapse_spacing_only():
+    codes, first = dedupe.score_keys(["good  video", "good video", "Good video", "good\tvideo "])
+    assert codes[0] == codes[1] == codes[3]
+    assert codes[2] != codes[0]
+    assert list(first) == [0, 2]
@@ -0,0 +1,30 @@
+import pipeline
+
+
+def agg(count, score_sum, positive, neutral, negative):
+    return {
+        "count": count,
+        "score_sum": score_sum,
+        "weight_sum": float(count),
+        "weighted_score_sum": score_sum,
+        "labels": {"Positive": positive, "Neutral": neutral, "Negative": negative},
+    }
+
+
+def test_collection_row_keeps_videos_with_the_same_title():
+    # Recurring streams and series episodes often share a title.
+    row = pipeline.collection_row(
+        "Channel",
+        {
+            "v1": ("Live stream", agg(2, 1.0, 1, 1, 0)),
+            "v2": ("Live stream", agg(4, -2.0, 0, 1, 3)),
+            "v3": ("Trailer", agg(1, 0.9, 1, 0, 0)),
+            "v4": ("No comments", None),
+        },
+    )
+    assert row["Videos"] == 3
+    assert row["Total Comments"] == 7
+    assert row["Comments per Video"] == 7 / 3
+    assert row["Negative %"] == 3 / 7 * 100
+    assert row["Most Positive Video"] == "Trailer"
+    assert row["Most Negative Video"] == "Live stream"
@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+import search_index
+
+COMMENTS = {
+    "c1": "Great video, I love it",
+    "c2": "not good at all",
+    "c3": "This is not very good",
+    "c4": "Amazing editing, amazingly fast",
+    "c5": "good good good",
+    "c6": "I love the music but not the video",
+    "c7": "\"Not good\" said nobody",
+}
+
+
+def build(comments=COMMENTS):
+    index = search_index.SearchIndex()
+    index.add(list(comments), list(comments.values()))
+    return index
+
+
+def search(index, query):
+    return sorted(index.search(search_index.parse_query(query)))
+
+
+def test_terms_are_anded():
+    assert search(build(), "love video") == ["c1", "c6"]
+    assert search(build(), "love AND music") == ["c6"]
+
+
+def test_or_matches_either_side():
+    assert search(build(), "amazing OR music") == ["c4", "c6"]
+    assert search(build(), "love video OR editing") == ["c1", "c4", "c6"]
+
+
+def test_quoted_phrase_needs_adjacent_words():
+    assert search(build(), '"not good"') == ["c2", "c7"]
+    assert search(build(), '"good not"') == []
+
+
+def test_prefix():
+    assert search(build(), "amaz*") == ["c4"]
+    assert search(build(), "goo* not") == ["c2", "c3", "c7"]
+    with pytest.raises(search_index.QueryError):
+        search_index.parse_query("not-go*")
+
+
+def test_unknown_words_and_empty_query():
+    assert search(build(), "zebra") == []
+    assert search(build(), "love zebra") == []
+    assert search(build(), "") == []
+
+
+def test_refresh_indexes_only_new_comments():
+    index = build()
+    assert index.add(list(COMMENTS), list(COMMENTS.values())) == 0
+    assert index.add(["c1", "c8"], ["Great video, I love it", "love this"]) == 1
+    assert len(index) == len(COMMENTS) + 1
+    postings = sum(len(terms) for terms, _, _ in index.segments)
+    assert postings == sum(len(search_index.tokenize(t)) for t in [*COMMENTS.values(), "love this"])
+    assert search(index, "love") == ["c1", "c6", "c8"]
+
+
+def test_page_by_page_matches_one_batch():
+    rng = random.Random(7)
+    words = ["good", "bad", "not", "very", "love", "hate", "video", "music", "amazing", "amazed"]
+    comments = {f"c{i}": " ".join(rng.choices(words, k=rng.randint(1, 8))) for i in range(2000)}
+    items = list(comments.items())
+    paged = search_index.SearchIndex()
+    for start in range(0, len(items), 100):
+        page = items[start:start + 100]
+        paged.add([c for c, _ in page], [t for _, t in page])
+    # Geometric merging keeps the segment count logarithmic.
+    assert len(paged.segments) <= 6
+    whole = build(comments)
+    for query in ["good", "not good", '"not good"', "amaz* OR hate", "love video music", '"very bad" OR "not very"']:
+        expected = sorted(
+            cid
+            for cid, text in comments.items()
+            if any(all(atom_matches(a, text) for a in atoms) for atoms in search_index.parse_query(query))
+        )
+        assert search(paged, query) == search(whole, query) == expected, query
+
+
+def atom_matches(atom, text):
+    kind, value = atom
+    tokens = search_index.tokenize(text)
+    if kind == "term":
+        return value in tokens
+    if kind == "prefix":
+        return any(t.startswith(value) for t in tokens)
+    n = len(value)
+    return any(tuple(tokens[i:i + n]) == value for i in range(len(tokens) - n + 1))
@@ -0,0 +1,102 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sentiment_engine
+
+textblob = pytest.importorskip("textblob")
+
+# The engine re-implements pattern's tokenizer and assessment (and imports
+# private textblob._text names), so it is checked against TextBlob itself.
+
+CASES = [
+    "",
+    None,
+    "   ",
+    "\n\n",
+    "Great video",
+    "great video!",
+    "not good",
+    "not very good at all",
+    "never really that bad",
+    "very very very good",
+    "extremely really incredibly bad",
+    "This is good (!)",
+    "Oh sure, that went well (!)",
+    "Wow!!! Amazing!",
+    "I love it :)",
+    "so sad :( :-(",
+    "<3 <3 best ever ;-)",
+    "It's not the worst, isn't it?",
+    "I don't like it. I can't stand it.",
+    "\"Brilliant\" they said... it's 'awful'",
+    "Dr. Smith vs. Mr. Jones e.g. a good i.e. fine etc. bad",
+    "U.S.A. is great. The U.K. is terrible.",
+    "first line is good\n\nsecond line is bad\n\n\nthird is nice",
+    "bad...good...ok",
+    "Loved it (sarcasm) (!) lol",
+    "http://example.com is a nice link",
+    "nice_video_bro",
+    "GOOD GOOD BAD",
+    "hmm.",
+    "The best! The worst? The middle.",
+    "Très bien, c'est magnifique",
+    "5/5 would watch again :D",
+]
+
+WORDS = [
+    "good", "bad", "not", "very", "really", "never", "love", "hate", "amazing", "terrible",
+    "nice", "awful", "great", "boring", "funny", "sad", "happy", "the", "video", "is", "was",
+    "it", "this", "so", "too", "extremely", "slightly", "don't", "isn't", "can't", "best",
+    "worst", "ok", "e.g.", "Mr.", "etc.", ":)", ":(", ";-)", "<3", "!", "(!)", "?", "...",
+    ",", "\"", "'", "(", ")", "\n", "\n\n", "-", "--",
+]
+
+
+def corpus(n=3000, seed=20240601):
+    rng = random.Random(seed)
+    out = list(CASES)
+    for _ in range(n):
+        words = rng.choices(WORDS, k=rng.randint(1, 25))
+        glue = rng.choice([" ", "", "  "])
+        text = " ".join(w + (glue if rng.random() < 0.2 else "") for w in words)
+        if rng.random() < 0.3:
+            text = text.capitalize()
+        out.append(text)
+    return out
+
+
+def textblob_polarity(texts):
+    # The pre-engine app scored str(comment) one at a time.
+    return np.array([textblob.TextBlob(str(t)).sentiment.polarity for t in texts])
+
+
+def test_polarity_matches_textblob():
+    texts = corpus()
+    expected = textblob_polarity(texts)
+    got = sentiment_engine.polarity(pd.Series(texts, dtype=object)).to_numpy()
+    mismatched = [(t, e, g) for t, e, g in zip(texts, expected, got) if e != g]
+    assert not mismatched, mismatched[:10]
+
+
+def test_labels_match_textblob_thresholds():
+    texts = corpus(500, seed=7)
+    expected = [
+        "Positive" if x > 0.1 else "Negative" if x < -0.1 else "Neutral" for x in textblob_polarity(texts)
+    ]
+    got = sentiment_engine.labels(sentiment_engine.polarity(pd.Series(texts, dtype=object)))
+    assert list(got) == expected
+
+
+def test_polarity_keeps_index_and_repeats():
+    texts = pd.Series(["good", "bad", "good", None], index=[10, 3, 7, 1], dtype=object)
+    got = sentiment_engine.polarity(texts)
+    assert list(got.index) == [10, 3, 7, 1]
+    assert got[10] == got[7] == textblob.TextBlob("good").sentiment.polarity
+    assert got[1] == textblob.TextBlob("None").sentiment.polarity
+
+
+def test_empty_input():
+    assert sentiment_engine.polarity(pd.Series([], dtype=object)).empty
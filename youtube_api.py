@@ -0,0 +1,96 @@
+import json
+import queue
+import threading
+import time
+
+# Shared YouTube Data API client. The discovery document is the static copy
+# bundled with google-api-python-client, so building a client never touches
+# the network, and requests go through a small pool of keep-alive
+# httplib2.Http objects so one client can be shared by every session.
+# googleapiclient and httplib2 are imported on first use, not at import time.
+
+SERVICE_NAME = "youtube"
+SERVICE_VERSION = "v3"
+HTTP_POOL_SIZE = 8
+HTTP_TIMEOUT = 30
+
+CLIENT_STATS = {"builds": 0, "build_ms": 0.0, "discovery_ms": 0.0, "lookups": 0}
+
+_DISCOVERY = None
+_DISCOVERY_LOCK = threading.Lock()
+
+
+class PooledHttp:
+    # Duck-types httplib2.Http for googleapiclient: each request borrows an
+    # idle connection holder and returns it afterwards, so concurrent
+    # requests never share one httplib2.Http (which is not thread-safe).
+
+    def __init__(self, size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+        import httplib2
+
+        self.size = size
+        self.timeout = timeout
+        self.redirect_codes = httplib2.REDIRECT_CODES
+        self._idle = queue.LifoQueue()
+        self.created = 0
+
+    def _checkout(self):
+        import httplib2
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            self.created += 1
+            return httplib2.Http(timeout=self.timeout)
+
+    def _checkin(self, h):
+        if self._idle.qsize() < self.size:
+            self._idle.put(h)
+        else:
+            h.close()
+
+    def request(self, *args, **kwargs):
+        h = self._checkout()
+        try:
+            return h.request(*args, **kwargs)
+        except Exception:
+            h.close()
+            raise
+        finally:
+            self._checkin(h)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def discovery_document():
+    global _DISCOVERY
+    with _DISCOVERY_LOCK:
+        if _DISCOVERY is None:
+            from googleapiclient.discovery_cache import get_static_doc
+
+            t0 = time.perf_counter()
+            _DISCOVERY = json.loads(get_static_doc(SERVICE_NAME, SERVICE_VERSION))
+            CLIENT_STATS["discovery_ms"] = (time.perf_counter() - t0) * 1000
+    return _DISCOVERY
+
+
+def build_service(api_key, http=None, api_endpoint=None):
+    # api_endpoint points the client at another host, e.g. the fake API
+    # server used by the benchmarks.
+    from googleapiclient.discovery import build_from_document
+
+    t0 = time.perf_counter()
+    service = build_from_document(
+        discovery_document(),
+        http=http or PooledHttp(),
+        developerKey=api_key,
+        client_options={"api_endpoint": api_endpoint} if api_endpoint else None,
+    )
+    CLIENT_STATS["builds"] += 1
+    CLIENT_STATS["build_ms"] = (time.perf_counter() - t0) * 1000
+    return service